@@ -0,0 +1,166 @@
+# src/api/jobs.py
+"""
+Background job queue for the REST pipeline.
+
+Heavy work (denoise, VAD, WavLM, Whisper) runs on a bounded thread pool so
+the uvicorn event loop stays free for health checks and WebSocket traffic.
+Models come from the shared registry, so worker threads reuse the same
+loaded instances (torch releases the GIL inside its kernels).
+With POOL_PROCESSES > 0, each job thread hands its work to an InferencePool
+process instead (own models, own pinned cores), so concurrent files scale
+across cores.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from src.utils.worker_pool import get_inference_pool
+
+# ----------------------------------------
+# CONFIG: worker pool / queue
+# ----------------------------------------
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", 2))
+PIPELINE_QUEUE_DEPTH = int(os.environ.get("PIPELINE_QUEUE_DEPTH", 16))
+MAX_FINISHED_JOBS = 256     # finished jobs kept for status / result lookups
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"      # queued → running → done / failed
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self.cached = False         # result served from the result cache
+
+    def info(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "cached": self.cached,
+        }
+
+
+class JobManager:
+    """
+    Bounded executor + in-memory job table.
+    At most `workers` jobs run at once and at most `max_queue` wait.
+    """
+
+    def __init__(self, workers=PIPELINE_WORKERS, max_queue=PIPELINE_QUEUE_DEPTH, pool=None):
+        self.pool = pool
+        # One job thread per worker process, so every process stays busy
+        self.workers = max(workers, pool.processes) if pool is not None else workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pipeline")
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _queued_locked(self):
+        return sum(1 for j in self.jobs.values() if j.status == "queued")
+
+    def _prune_locked(self):
+        finished = [k for k, j in self.jobs.items() if j.status in ("done", "failed")]
+        for k in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self.jobs.pop(k)
+
+    def _run(self, job, fn, args, kwargs, in_pool):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            if in_pool and self.pool is not None:
+                job.result = self.pool.submit(fn, *args, **kwargs).result()
+            else:
+                job.result = fn(*args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+        return job.result
+
+    def submit(self, fn, *args, job_id=None, in_pool=True, **kwargs):
+        """
+        Queue fn(*args, **kwargs); raises QueueFullError when saturated.
+        With a process pool, fn runs in a worker process unless in_pool=False
+        (for work that must update this process's state, e.g. enrollment).
+        """
+        job = Job(job_id or uuid.uuid4().hex)
+        with self._lock:
+            if self._queued_locked() >= self.max_queue:
+                raise QueueFullError(
+                    f"Job queue full ({self.max_queue} waiting); try again later"
+                )
+            self._prune_locked()
+            self.jobs[job.id] = job
+            job.future = self.executor.submit(self._run, job, fn, args, kwargs, in_pool)
+        return job
+
+    def add_finished(self, result, job_id=None, cached=True):
+        """Record an already-available result (e.g. a cache hit) as a done job."""
+        job = Job(job_id or uuid.uuid4().hex)
+        job.started = job.finished = job.created
+        job.result = result
+        job.status = "done"
+        job.cached = cached
+        job.future = Future()
+        job.future.set_result(result)
+        with self._lock:
+            self._prune_locked()
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    async def wait(self, job, timeout=None):
+        """
+        Wait (without blocking the event loop) for a job to finish.
+        Returns True if it finished within timeout; the job keeps running otherwise.
+        """
+        fut = asyncio.wrap_future(job.future)
+        done, _ = await asyncio.wait({fut}, timeout=timeout)
+        return bool(done)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for j in self.jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "jobs": counts,
+            "pool": self.pool.stats() if self.pool is not None else None,
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Process-wide job manager singleton."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(pool=get_inference_pool())
+        return _manager
@@ -1,12 +1,24 @@
 # src/api/routes_rest.py
 
 import os
-from fastapi import APIRouter, UploadFile, File
+import uuid
+import asyncio
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Query
 from fastapi.responses import JSONResponse
 
 from src.utils.audio_io import load_audio
+from src.utils.audio_cache import load_audio_cached, get_audio_cache
+from src.utils.result_cache import get_result_cache, result_key, pipeline_params, array_digest
 from src.preprocess.denoise import denoise_audio
 from src.diarization.diarizer import diarize_and_transcribe
+from src.utils.model_registry import get_registry, get_speaker_embedder
+from src.speaker.embedding_store import get_embedding_store
+from src.speaker.speaker_index import SpeakerIndex
+from src.api.jobs import get_job_manager, QueueFullError
 
 router = APIRouter()
 
@@ -14,37 +26,413 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__ + "/../.."))
 UPLOAD_DIR = os.path.join(PROJECT_ROOT, "data", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# ----------------------------------------
+# CONFIG: uploads
+# ----------------------------------------
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", 200))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+SPEAKER_INDEX_CACHE_SIZE = 8    # built SpeakerIndex objects kept per store version
 
-@router.post("/process")
-async def process_audio(mixture: UploadFile = File(...), target: UploadFile = File(...)):
+_speaker_indexes = OrderedDict()
+_speaker_indexes_lock = threading.Lock()
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class UnknownSpeakerError(KeyError):
+    pass
+
+
+def _remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def run_process_pipeline(mix_path, tgt_path=None, target_emb=None, speaker_index=None, top_k=1,
+                         target_only=False, ambiguous_margin=0.0):
     """
-    REST endpoint to process mixture + target audio.
+    Blocking pipeline body, executed on the job worker pool.
     Runs: denoise → diarization → speaker match → ASR
+    The target is an uploaded sample (tgt_path), an enrolled embedding
+    (target_emb) or a SpeakerIndex over several enrolled speakers.
+    target_only skips ASR / punctuation for segments that do not match.
+    Temp files are deleted once decoded; repeat uploads of the same
+    recording are served from the decoded-audio cache.
+    """
+    target_audio, tsr = None, None
+    try:
+        mixture_audio, sr = load_audio_cached(mix_path)
+        if tgt_path is not None:
+            target_audio, tsr = load_audio_cached(tgt_path)
+    finally:
+        _remove_files(mix_path, *([tgt_path] if tgt_path else []))
+
+    denoised = denoise_audio(mixture_audio, sr)
+
+    return diarize_and_transcribe(
+        denoised, sr, target_audio, tsr, use_demucs=False,
+        target_emb=target_emb, speaker_index=speaker_index, top_k=top_k,
+        target_only=target_only, ambiguous_margin=ambiguous_margin
+    )
+
+
+def run_enrollment(speaker_id, sample_path, threshold=None):
+    """Embed an enrollment sample and persist it under speaker_id."""
+    try:
+        audio, sr = load_audio(sample_path)
+    finally:
+        _remove_files(sample_path)
+
+    emb = get_speaker_embedder().embed_windowed(audio, sr)
+    meta = {"duration_sec": round(len(audio) / sr, 2)}
+    if threshold is not None:
+        meta["threshold"] = threshold
+    get_embedding_store().add(speaker_id, emb, **meta)
+    return {"speaker_id": speaker_id, "dim": int(emb.shape[0])}
+
+
+async def _save_upload(upload: UploadFile, prefix):
+    """
+    Stream an upload to a unique temp file in chunks.
+    Raises UploadTooLargeError (and removes the partial file) past MAX_UPLOAD_MB.
+    """
+    max_bytes = int(MAX_UPLOAD_MB * 1024 * 1024)
+    suffix = os.path.splitext(upload.filename or "")[1] or ".wav"
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=UPLOAD_DIR)
+
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"Upload '{upload.filename}' exceeds {MAX_UPLOAD_MB:g} MB"
+                    )
+                f.write(chunk)
+    except Exception:
+        _remove_files(path)
+        raise
+    finally:
+        await upload.close()
+
+    return path
+
+
+async def _result_key(mix_path, tgt_path, speaker_id, target_emb, speaker_index,
+                      top_k, approximate, target_only, ambiguous_margin):
+    """
+    Result-cache key: content digests of the uploads (memoized by the audio
+    cache, so the pipeline does not hash them again), the enrolled
+    embeddings used as target, and every pipeline parameter.
     """
+    cache = get_audio_cache()
+    inputs = [await asyncio.to_thread(cache.digest, mix_path)]
+    if tgt_path is not None:
+        inputs.append(await asyncio.to_thread(cache.digest, tgt_path))
+    elif speaker_index is not None:
+        inputs += [",".join(speaker_index.speaker_ids),
+                   array_digest(speaker_index.matrix), array_digest(speaker_index.thresholds)]
+    else:
+        inputs += [speaker_id, array_digest(target_emb)]
+    params = pipeline_params(
+        pipeline="process", use_demucs=False, top_k=top_k, approximate=approximate,
+        target_only=target_only, ambiguous_margin=ambiguous_margin,
+    )
+    return result_key(inputs, params)
+
+
+def _store_result(key, job):
+    if job.status != "done":
+        return
     try:
-        mix_path = os.path.join(UPLOAD_DIR, "mixture.wav")
-        tgt_path = os.path.join(UPLOAD_DIR, "target.wav")
+        get_result_cache().put(key, job.result)
+    except Exception as e:
+        print(f"→ Could not cache result of job {job.id}: {e}")
+
 
-        # Save files
-        with open(mix_path, "wb") as f:
-            f.write(await mixture.read())
-        with open(tgt_path, "wb") as f:
-            f.write(await target.read())
+def _build_speaker_index(speaker_ids, approximate=False):
+    """
+    speaker_ids: comma-separated enrolled ids, or "*" for all of them.
+    Built indexes are reused until the store changes (its version is part
+    of the key). Blocking: call it off the event loop.
+    """
+    store = get_embedding_store()
+    ids = None if speaker_ids.strip() == "*" else [
+        sid.strip() for sid in speaker_ids.split(",") if sid.strip()
+    ]
+    if ids is None and len(store) == 0:
+        raise UnknownSpeakerError("No speakers are enrolled")
+    if ids == []:
+        raise UnknownSpeakerError("No speaker ids given")
 
-        # Load & process
-        mixture_audio, sr = load_audio(mix_path)
-        target_audio, tsr = load_audio(tgt_path)
+    key = (store.version, tuple(ids) if ids is not None else None, approximate)
+    with _speaker_indexes_lock:
+        if key in _speaker_indexes:
+            _speaker_indexes.move_to_end(key)
+            return _speaker_indexes[key]
+    try:
+        index = SpeakerIndex.from_store(store, ids, approximate=approximate)
+    except KeyError as e:
+        raise UnknownSpeakerError(e.args[0])
+    with _speaker_indexes_lock:
+        _speaker_indexes[key] = index
+        while len(_speaker_indexes) > SPEAKER_INDEX_CACHE_SIZE:
+            _speaker_indexes.popitem(last=False)
+    return index
 
-        denoised = denoise_audio(mixture_audio, sr)
 
-        diarization_result = diarize_and_transcribe(
-            denoised, sr, target_audio, tsr, use_demucs=False
+async def _submit(
+    mixture: UploadFile,
+    target: UploadFile = None,
+    speaker_id: str = None,
+    speaker_ids: str = None,
+    top_k: int = 1,
+    approximate: bool = False,
+    target_only: bool = False,
+    ambiguous_margin: float = 0.0,
+    use_cache: bool = True,
+):
+    """
+    Stream uploads to per-job temp files and queue the pipeline.
+    The target comes from the upload, the enrollment store (speaker_id),
+    or a SpeakerIndex over several enrolled speakers (speaker_ids).
+    A result cached for the same inputs and parameters comes back as an
+    already finished job (job.cached) without queueing anything.
+    """
+    target_emb = None
+    speaker_index = None
+    if speaker_ids:
+        # Copies the gallery (and clusters it when approximate): not on the event loop
+        speaker_index = await asyncio.to_thread(_build_speaker_index, speaker_ids, approximate)
+    elif speaker_id:
+        target_emb = get_embedding_store().get(speaker_id)
+        if target_emb is None:
+            raise UnknownSpeakerError(f"Speaker '{speaker_id}' is not enrolled")
+    elif target is None:
+        raise ValueError("Provide a target upload, a speaker_id or speaker_ids")
+
+    job_id = uuid.uuid4().hex
+    mix_path = await _save_upload(mixture, f"{job_id}_mixture_")
+    tgt_path = None
+    try:
+        if target_emb is None and speaker_index is None:
+            tgt_path = await _save_upload(target, f"{job_id}_target_")
+
+        key = await _result_key(
+            mix_path, tgt_path, speaker_id, target_emb, speaker_index,
+            top_k, approximate, target_only, ambiguous_margin
         )
+        cached = get_result_cache().get(key) if use_cache else None
+        if cached is not None:
+            _remove_files(mix_path, *([tgt_path] if tgt_path else []))
+            return get_job_manager().add_finished(cached, job_id=job_id)
+
+        job = get_job_manager().submit(
+            run_process_pipeline, mix_path, tgt_path, target_emb, speaker_index, top_k,
+            target_only, ambiguous_margin, job_id=job_id
+        )
+        job.future.add_done_callback(lambda _: _store_result(key, job))
+        return job
+    except Exception:
+        _remove_files(mix_path, *([tgt_path] if tgt_path else []))
+        raise
+
+
+def _error_response(e):
+    if isinstance(e, UploadTooLargeError):
+        return JSONResponse({"error": str(e)}, status_code=413)
+    if isinstance(e, UnknownSpeakerError):
+        return JSONResponse({"error": e.args[0]}, status_code=404)
+    if isinstance(e, ValueError):
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if isinstance(e, QueueFullError):
+        return JSONResponse({"error": str(e)}, status_code=503)
+    return JSONResponse({"error": str(e)}, status_code=500)
+
+
+def _cache_header(job):
+    return {"X-Result-Cache": "hit" if job.cached else "miss"}
 
-        return JSONResponse(diarization_result)
 
+def _job_response(job):
+    if job.status == "done":
+        return JSONResponse({**job.info(), "result": job.result}, headers=_cache_header(job))
+    if job.status == "failed":
+        return JSONResponse(job.info(), status_code=500)
+    return JSONResponse(job.info(), status_code=202)
+
+
+@router.post("/process")
+async def process_audio(
+    mixture: UploadFile = File(...),
+    target: Optional[UploadFile] = File(None),
+    speaker_id: Optional[str] = Form(None),
+    speaker_ids: Optional[str] = Form(None),
+    top_k: int = Form(1),
+    approximate: bool = Form(False),
+    target_only: bool = Form(False),
+    ambiguous_margin: float = Form(0.0),
+    use_cache: bool = Form(True),
+):
+    """
+    REST endpoint to process mixture + target audio.
+    Runs: denoise → diarization → speaker match → ASR
+    Pass speaker_id instead of target to use an enrolled speaker, or
+    speaker_ids ("a,b,c" or "*") to label segments with enrolled speaker ids.
+    target_only=true transcribes only matching segments (plus those within
+    ambiguous_margin below the threshold); the rest come back without text.
+    The pipeline runs on the worker pool; this call awaits it without
+    blocking the event loop and returns the diarization list as before.
+    Repeat requests (same audio bytes, target and parameters) are answered
+    from the result cache; the X-Result-Cache header says hit or miss.
+    use_cache=false forces a fresh run.
+    """
+    try:
+        job = await _submit(
+            mixture, target, speaker_id, speaker_ids, top_k, approximate,
+            target_only, ambiguous_margin, use_cache
+        )
     except Exception as e:
-        return JSONResponse(
-            {"error": str(e)},
-            status_code=500
+        return _error_response(e)
+
+    await get_job_manager().wait(job)
+    if job.status == "failed":
+        return JSONResponse({"error": job.error}, status_code=500)
+    return JSONResponse(job.result, headers=_cache_header(job))
+
+
+@router.post("/jobs")
+async def submit_job(
+    mixture: UploadFile = File(...),
+    target: Optional[UploadFile] = File(None),
+    speaker_id: Optional[str] = Form(None),
+    speaker_ids: Optional[str] = Form(None),
+    top_k: int = Form(1),
+    approximate: bool = Form(False),
+    target_only: bool = Form(False),
+    ambiguous_margin: float = Form(0.0),
+    use_cache: bool = Form(True),
+    wait: Optional[float] = Query(None, description="Seconds to wait for the result"),
+):
+    """
+    Queue a processing job and return its id.
+    With ?wait=N, returns the result directly if it finishes within N seconds.
+    Cache hits come back finished at once, with "cached": true.
+    """
+    try:
+        job = await _submit(
+            mixture, target, speaker_id, speaker_ids, top_k, approximate,
+            target_only, ambiguous_margin, use_cache
         )
+    except Exception as e:
+        return _error_response(e)
+
+    if wait:
+        await get_job_manager().wait(job, timeout=wait)
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse({"error": "unknown job id"}, status_code=404)
+    return JSONResponse(job.info())
+
+
+@router.get("/jobs/{job_id}/result")
+async def job_result(
+    job_id: str,
+    wait: Optional[float] = Query(None, description="Seconds to wait for the result"),
+):
+    """Result of a finished job (202 while still queued / running)."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse({"error": "unknown job id"}, status_code=404)
+
+    if wait:
+        await get_job_manager().wait(job, timeout=wait)
+    return _job_response(job)
+
+
+@router.post("/speakers/{speaker_id}")
+async def enroll_speaker(
+    speaker_id: str,
+    sample: UploadFile = File(...),
+    threshold: Optional[float] = Form(None),
+):
+    """
+    Enroll a target speaker: embed the sample once and store it under speaker_id.
+    Later /process calls can pass speaker_id instead of uploading the target.
+    threshold optionally overrides the match threshold for this speaker.
+    """
+    try:
+        path = await _save_upload(sample, f"enroll_{uuid.uuid4().hex}_")
+        try:
+            # Runs in this process: the embedding store lives here
+            job = get_job_manager().submit(
+                run_enrollment, speaker_id, path, threshold, in_pool=False
+            )
+        except Exception:
+            _remove_files(path)
+            raise
+    except Exception as e:
+        return _error_response(e)
+
+    await get_job_manager().wait(job)
+    if job.status == "failed":
+        return JSONResponse({"error": job.error}, status_code=500)
+    return JSONResponse(job.result)
+
+
+@router.get("/speakers")
+async def list_speakers():
+    return JSONResponse(get_embedding_store().list_speakers())
+
+
+@router.delete("/speakers/{speaker_id}")
+async def delete_speaker(speaker_id: str):
+    if not get_embedding_store().remove(speaker_id):
+        return JSONResponse({"error": "unknown speaker id"}, status_code=404)
+    return JSONResponse({"deleted": speaker_id})
+
+
+@router.get("/models")
+async def model_stats():
+    """
+    Model registry stats: resident models, loads, hits / misses, evictions.
+    """
+    return JSONResponse(get_registry().stats())
+
+
+@router.get("/cache/audio")
+async def audio_cache_stats():
+    """Decoded-audio cache stats: hits / misses, evictions, size on disk."""
+    return JSONResponse(get_audio_cache().stats())
+
+
+@router.get("/cache/results")
+async def result_cache_stats():
+    """Result cache stats: hits (memory / disk), misses, evictions, size on disk."""
+    return JSONResponse(get_result_cache().stats())
+
+
+@router.delete("/cache/results")
+async def clear_result_cache():
+    get_result_cache().clear()
+    return JSONResponse({"cleared": True})
+
+
+@router.get("/jobs")
+async def job_stats():
+    """Worker pool / queue stats."""
+    return JSONResponse(get_job_manager().stats())
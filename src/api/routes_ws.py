@@ -4,11 +4,11 @@ import os
 import json
 import numpy as np
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 
-from src.speaker.embedder import SpeakerEmbedder
 from src.utils.audio_io import load_audio
-from src.asr.asr_tiny import TinyWhisperASR
-from src.preprocess.vad import simple_vad
+from src.utils.model_registry import get_tiny_asr
+from src.streaming.engine import StreamingTranscriber
 
 router = APIRouter()
 
@@ -16,8 +16,6 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__ + "/../.."))
 UPLOAD_DIR = os.path.join(PROJECT_ROOT, "data", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-asr = TinyWhisperASR()
-
 class WSManager:
     def __init__(self):
         self.active = []
@@ -36,7 +34,15 @@ manager = WSManager()
 async def websocket_endpoint(ws: WebSocket):
     await manager.connect(ws)
 
-    buffer = np.array([], dtype=np.float32)
+    # Partial hypotheses and denoising are opt-in: /ws/stream?partial=1&denoise=1
+    partial = ws.query_params.get("partial") in ("1", "true")
+    denoise = ws.query_params.get("denoise") in ("1", "true")
+    engine = StreamingTranscriber(
+        get_tiny_asr(),
+        sr=16000,
+        partial_interval_sec=1.0 if partial else None,
+        denoise=denoise,
+    )
 
     await ws.send_json({"status": "connected"})
 
@@ -44,18 +50,12 @@ async def websocket_endpoint(ws: WebSocket):
         while True:
             chunk = await ws.receive_bytes()
 
-            # Convert bytes → float32 audio
+            # Convert bytes → float32 audio (16 kHz mono)
             audio = np.frombuffer(chunk, dtype=np.float32)
-            buffer = np.concatenate([buffer, audio])
-
-            # VAD triggers ASR
-            if simple_vad(buffer):
-                text, conf = asr.transcribe(buffer, 16000)
 
-                await ws.send_json({
-                    "text": text,
-                    "confidence": conf
-                })
+            # VAD endpointing + ASR on finalized utterances only (off the event loop)
+            for msg in await run_in_threadpool(engine.process, audio):
+                await ws.send_json(msg)
 
     except WebSocketDisconnect:
         manager.disconnect(ws)
@@ -1,16 +1,77 @@
 # src/asr/asr_engine.py
 """
 Stable Whisper ASR for Transformers 4.40+ (no encoder_attention_mask argument).
-Uses safe token limits and chunk truncation for CPU speed.
+Uses safe token limits for CPU speed. Audio longer than one 30 s window is
+transcribed in overlapping windows (transcribe_long) instead of truncated.
 """
 
 import os
 import torch
 import librosa
 import numpy as np
-import torch.nn.functional as F
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
 
+from src.utils.batching import length_sorted_batches
+from src.asr.features import whisper_log_mel
+from src.asr.scoring import score_sequences
+from src.utils.backends import apply_whisper_backend
+
+ASR_BATCH_SIZE = 8
+
+# ----------------------------------------
+# CONFIG: long-form transcription
+# ----------------------------------------
+LONG_FORM_WINDOW_SEC = 30     # Whisper's native input length
+LONG_FORM_OVERLAP_SEC = 5     # audio shared by consecutive windows
+MIN_TOKEN_MATCH = 2           # shortest token run trusted as an overlap anchor
+
+
+def _longest_common_run(a, b):
+    """
+    Longest contiguous run shared by token arrays a and b.
+    Returns (start_in_a, start_in_b, length); length 0 if nothing matches.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return 0, 0, 0
+    eq = np.asarray(a)[:, None] == np.asarray(b)[None, :]
+    run = np.zeros(len(b) + 1, dtype=np.int32)
+    best = (0, 0, 0)
+    for i in range(len(a)):
+        # run[j + 1] = length of the common run ending at a[i], b[j]
+        run[1:] = (run[:-1] + 1) * eq[i]
+        j = int(np.argmax(run))
+        if run[j] > best[2]:
+            best = (i - int(run[j]) + 1, j - int(run[j]), int(run[j]))
+    return best
+
+
+def stitch_tokens(merged, tokens, overlap_ratio):
+    """
+    Append one window's tokens to the running transcript, dropping the
+    tokens both windows decoded from their shared audio.
+
+    overlap_ratio: fraction of the new window that overlaps the previous one.
+    The longest common token run in the overlap region anchors the cut;
+    without one, both sides are cut at the middle of the overlap.
+    """
+    if not merged:
+        return list(tokens)
+    if len(tokens) == 0:
+        return merged
+
+    # Search a little beyond the expected overlap size on both sides
+    span = int(np.ceil(len(tokens) * overlap_ratio * 1.5)) + 4
+    tail = merged[-span:]
+    head = tokens[:span]
+
+    i, j, length = _longest_common_run(tail, head)
+    if length >= MIN_TOKEN_MATCH:
+        cut = len(merged) - len(tail) + i
+        return merged[:cut] + list(tokens[j:])
+
+    half = int(round(len(tokens) * overlap_ratio / 2))
+    return merged[:len(merged) - half] + list(tokens[half:])
+
 
 class WhisperASR:
     def __init__(
@@ -18,10 +79,14 @@ class WhisperASR:
         model_name_or_path="openai/whisper-small",
         device="cpu",
         local_model_path=None,
-        max_new_tokens=120,          # safe limit
-        max_audio_sec=30,            # limit each chunk length
+        max_new_tokens=120,          # safe limit (per 30 s window)
+        max_audio_sec=LONG_FORM_WINDOW_SEC,   # single-window length
+        batch_size=ASR_BATCH_SIZE,   # max clips per generate() call
+        backend="eager",             # eager | int8 | torchscript | onnx
     ):
         self.device = device
+        self.batch_size = batch_size
+        self.backend = backend
         self.max_new_tokens = max_new_tokens
         self.max_audio_sec = max_audio_sec
 
@@ -31,6 +96,9 @@ class WhisperASR:
         # Load Whisper processor + model
         self.processor = WhisperProcessor.from_pretrained(model_source)
         self.model = WhisperForConditionalGeneration.from_pretrained(model_source).to(device)
+        self.model = apply_whisper_backend(
+            self.model, backend, model_source, self.processor.feature_extractor
+        )
 
         # Force English transcription
         self.language = "en"
@@ -52,22 +120,29 @@ class WhisperASR:
         audio: np.ndarray,
         sr: int,
         max_length_seconds: int = None,
-        max_new_tokens: int = None
+        max_new_tokens: int = None,
+        return_scores: bool = False
     ):
         """
         Transcribe audio and return (text, confidence)
+        max_length_seconds optionally clips the input; audio longer than one
+        window goes through transcribe_long instead of being truncated.
+        With return_scores=True, returns (text, confidence, scores) where
+        scores holds token probabilities and word-level confidence
+        (see src.asr.scoring.score_sequences; None for long-form input).
         """
 
         # Apply defaults
-        if max_length_seconds is None:
-            max_length_seconds = self.max_audio_sec
         if max_new_tokens is None:
             max_new_tokens = self.max_new_tokens
 
-        # --- 1) Clip audio ---
-        max_len = int(sr * max_length_seconds)
-        if len(audio) > max_len:
-            audio = audio[:max_len]
+        # --- 1) Clip audio (only when asked to) ---
+        if max_length_seconds is not None:
+            audio = audio[:int(sr * max_length_seconds)]
+
+        if len(audio) > int(sr * self.max_audio_sec):
+            text, confidence, _ = self.transcribe_long(audio, sr, max_new_tokens=max_new_tokens)
+            return (text, confidence, None) if return_scores else (text, confidence)
 
         # --- 2) Resample to 16k ---
         if sr != 16000:
@@ -82,7 +157,7 @@ class WhisperASR:
             padding=True
         ).to(self.device)
 
-        input_features = inputs.input_features
+        input_features = inputs.input_features.to(self.model.dtype)
 
         # --- 4) Generate transcription ---
         try:
@@ -113,18 +188,170 @@ class WhisperASR:
             skip_special_tokens=True
         )[0].strip()
 
-        # --- 6) Compute confidence ---
-        confidence = 0.0
-        try:
-            scores = outputs.scores
-            max_probs = []
-            for s in scores:
-                probs = F.softmax(s, dim=-1)
-                maxp = float(probs.max(dim=-1)[0].mean().cpu().numpy())
-                max_probs.append(maxp)
-            if max_probs:
-                confidence = float(np.mean(max_probs))
-        except Exception:
-            confidence = 0.0
+        # --- 6) Token-level scores + confidence ---
+        scores = score_sequences(self.model, self.processor.tokenizer, outputs)[0]
+        confidence = scores["confidence"]
 
+        if return_scores:
+            return text, confidence, scores
         return text, confidence
+
+    def transcribe_batch(
+        self,
+        audios,
+        sr: int,
+        max_length_seconds: int = None,
+        max_new_tokens: int = None,
+        batch_size: int = None,
+        return_scores: bool = False
+    ):
+        """
+        Transcribe many clips with batched feature extraction + generate().
+        Clips are length-sorted into batches of at most batch_size; log-mel
+        features are built per batch.
+        Clips longer than one window go through transcribe_long, as in
+        transcribe, instead of being truncated (scores are None for them).
+        Returns a list of (text, confidence) in input order
+        ((text, confidence, scores) with return_scores=True).
+        """
+        if max_new_tokens is None:
+            max_new_tokens = self.max_new_tokens
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        if len(audios) == 0:
+            return []
+
+        # --- 1) Clip (only when asked to), long clips to long-form ---
+        if max_length_seconds is not None:
+            audios = [a[:int(sr * max_length_seconds)] for a in audios]
+
+        results = [None] * len(audios)
+        window = int(sr * self.max_audio_sec)
+        short = []
+        for i, a in enumerate(audios):
+            if len(a) > window:
+                text, confidence, _ = self.transcribe_long(a, sr, max_new_tokens=max_new_tokens)
+                results[i] = (text, confidence, None) if return_scores else (text, confidence)
+            else:
+                short.append(i)
+
+        # --- 2) Resample ---
+        if sr != 16000:
+            audios = {i: librosa.resample(audios[i], orig_sr=sr, target_sr=16000) for i in short}
+            sr = 16000
+
+        # --- 3) Generate per length-sorted batch ---
+        for batch in length_sorted_batches([len(audios[i]) for i in short], batch_size):
+            idx = [short[b] for b in batch]
+            # Log-mel over each clip only (no 30 s padded STFT), [B, 80, 3000]
+            features = whisper_log_mel([audios[i] for i in idx], self.processor.feature_extractor)
+            input_features = torch.from_numpy(features).to(self.device, dtype=self.model.dtype)
+
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_features,
+                    return_dict_in_generate=True,
+                    output_scores=True,
+                    max_new_tokens=max_new_tokens,
+                    task="transcribe",
+                    language="en",
+                )
+
+            texts = self.processor.batch_decode(
+                outputs.sequences,
+                skip_special_tokens=True
+            )
+            scores = score_sequences(self.model, self.processor.tokenizer, outputs)
+
+            for j, i in enumerate(idx):
+                text = texts[j].strip()
+                if return_scores:
+                    results[i] = (text, scores[j]["confidence"], scores[j])
+                else:
+                    results[i] = (text, scores[j]["confidence"])
+
+        return results
+
+    def transcribe_long(
+        self,
+        audio: np.ndarray,
+        sr: int,
+        window_sec: float = None,
+        overlap_sec: float = LONG_FORM_OVERLAP_SEC,
+        max_new_tokens: int = None,
+        batch_size: int = None
+    ):
+        """
+        Long-form transcription over the full recording.
+        The audio is cut into window_sec windows overlapping by overlap_sec,
+        windows are decoded batch_size at a time, and the token streams are
+        stitched by de-duplicating the tokens decoded from each overlap.
+
+        Returns (text, confidence, windows) where windows is a list of
+        {"start", "end", "text", "confidence"} (seconds in the input audio).
+        """
+        if window_sec is None:
+            window_sec = self.max_audio_sec
+        if max_new_tokens is None:
+            max_new_tokens = self.max_new_tokens
+        if batch_size is None:
+            batch_size = self.batch_size
+        if not 0 <= overlap_sec < window_sec:
+            raise ValueError("overlap_sec must be in [0, window_sec)")
+
+        # --- 1) Resample once, up front ---
+        if sr != 16000:
+            audio = librosa.resample(np.asarray(audio, dtype=np.float32), orig_sr=sr, target_sr=16000)
+            sr = 16000
+        n = len(audio)
+        if n == 0:
+            return "", 0.0, []
+
+        # --- 2) Window grid (last window is aligned to the end of the audio) ---
+        win = int(window_sec * sr)
+        step = win - int(overlap_sec * sr)
+        starts = list(range(0, max(n - win, 0) + 1, step))
+        if starts[-1] + win < n:
+            starts.append(n - win)
+
+        # --- 3) Decode windows in batches ---
+        tokens, confs = [], []
+        for b in range(0, len(starts), batch_size):
+            batch = [audio[s:s + win] for s in starts[b:b + batch_size]]
+            features = whisper_log_mel(batch, self.processor.feature_extractor)
+            input_features = torch.from_numpy(features).to(self.device, dtype=self.model.dtype)
+
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_features,
+                    return_dict_in_generate=True,
+                    output_scores=True,
+                    max_new_tokens=max_new_tokens,
+                    task="transcribe",
+                    language="en",
+                )
+
+            for scores in score_sequences(self.model, self.processor.tokenizer, outputs):
+                tokens.append(scores["tokens"])
+                confs.append(scores["confidence"])
+
+        # --- 4) Stitch overlapping windows ---
+        merged, windows = [], []
+        for k, (s, toks) in enumerate(zip(starts, tokens)):
+            e = min(s + win, n)
+            overlap = max(0, starts[k - 1] + win - s) if k else 0
+            merged = stitch_tokens(merged, toks, overlap / max(e - s, 1))
+            windows.append({
+                "start": s / sr,
+                "end": e / sr,
+                "text": self.processor.tokenizer.decode(toks, skip_special_tokens=True).strip(),
+                "confidence": float(confs[k]),
+            })
+
+        text = self.processor.tokenizer.decode(merged, skip_special_tokens=True).strip()
+
+        # Window confidences weighted by how many tokens each window produced
+        weights = np.array([max(len(t), 1) for t in tokens], dtype=np.float64)
+        confidence = float(np.average(confs, weights=weights))
+        return text, confidence, windows
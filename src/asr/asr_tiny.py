@@ -4,6 +4,18 @@ import numpy as np
 import torch
 from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
 
+from src.utils.batching import length_sorted_batches, item_lengths
+from src.asr.features import whisper_log_mel
+from src.asr.scoring import score_sequences
+from src.utils.backends import apply_whisper_backend
+
+# ----------------------------------------
+# CONFIG: chunk-level ASR
+# ----------------------------------------
+TINY_MODEL = "openai/whisper-tiny"
+TINY_BATCH_SIZE = 16
+TINY_MAX_NEW_TOKENS = 64     # greedy decoding, at most this many tokens per chunk
+
 
 class TinyWhisperASR:
     """
@@ -11,9 +23,11 @@ class TinyWhisperASR:
     CPU-friendly, used for chunk-level diarization.
     """
 
-    def __init__(self, device="cpu", local_model_path=None):
+    def __init__(self, device="cpu", local_model_path=None, batch_size=TINY_BATCH_SIZE, backend="eager"):
         self.device = device
-        model_id = local_model_path if local_model_path else "openai/whisper-tiny"
+        self.batch_size = batch_size
+        self.backend = backend
+        model_id = local_model_path if local_model_path else TINY_MODEL
 
         # Processor (tokenizer + feature extractor)
         self.processor = AutoProcessor.from_pretrained(model_id)
@@ -21,10 +35,16 @@ class TinyWhisperASR:
         # ASR model
         self.model = AutoModelForSpeechSeq2Seq.from_pretrained(model_id).to(device)
 
-    def transcribe(self, audio: np.ndarray, sr: int):
+        # Optional CPU backend (int8 / exported encoder graph)
+        self.model = apply_whisper_backend(
+            self.model, backend, model_id, self.processor.feature_extractor
+        )
+
+    def transcribe(self, audio: np.ndarray, sr: int, return_scores: bool = False):
         """
         Transcribe a single audio chunk.
-        Returns: text, confidence
+        Returns: text, confidence (mean generated-token probability)
+        With return_scores=True: text, confidence, scores (token / word level)
         """
 
         # Resample to 16k
@@ -38,17 +58,64 @@ class TinyWhisperASR:
             sampling_rate=sr,
             return_tensors="pt"
         ).to(self.device)
+        input_features = inputs.input_features.to(self.model.dtype)
 
         with torch.no_grad():
-            generated = self.model.generate(
-                **inputs,
-                max_new_tokens=64,
-                do_sample=False
+            outputs = self.model.generate(
+                input_features,
+                max_new_tokens=TINY_MAX_NEW_TOKENS,
+                do_sample=False,
+                return_dict_in_generate=True,
+                output_scores=True
             )
 
-        text = self.processor.batch_decode(generated, skip_special_tokens=True)[0]
+        text = self.processor.batch_decode(outputs.sequences, skip_special_tokens=True)[0]
+        scores = score_sequences(self.model, self.processor.tokenizer, outputs)[0]
+
+        if return_scores:
+            return text.strip(), scores["confidence"], scores
+        return text.strip(), scores["confidence"]
+
+    def transcribe_batch(self, audios, sr: int, batch_size: int = None, return_scores: bool = False):
+        """
+        Transcribe many audio chunks with batched log-mel extraction
+        and batched generate(). Chunks are length-sorted into batches.
+        Returns: list of (text, confidence) in input order
+        ((text, confidence, scores) with return_scores=True)
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+        if len(audios) == 0:
+            return []
+
+        if sr != 16000:
+            import librosa
+            audios = [librosa.resample(a, orig_sr=sr, target_sr=16000) for a in audios]
+            sr = 16000
+
+        results = [None] * len(audios)
+        for idx in length_sorted_batches(item_lengths(audios), batch_size):
+            # Whisper inputs are fixed [80, 3000], so features stack without masks;
+            # the STFT only covers each chunk, not its 30 s padding
+            features = whisper_log_mel([audios[i] for i in idx], self.processor.feature_extractor)
+            input_features = torch.from_numpy(features).to(self.device, dtype=self.model.dtype)
+
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_features,
+                    max_new_tokens=TINY_MAX_NEW_TOKENS,
+                    do_sample=False,
+                    return_dict_in_generate=True,
+                    output_scores=True
+                )
 
-        # crude confidence estimate (for compatibility)
-        confidence = 0.8 if len(text.strip()) > 0 else 0.1
+            texts = self.processor.batch_decode(outputs.sequences, skip_special_tokens=True)
+            scores = score_sequences(self.model, self.processor.tokenizer, outputs)
+            for j, i in enumerate(idx):
+                text = texts[j].strip()
+                if return_scores:
+                    results[i] = (text, scores[j]["confidence"], scores[j])
+                else:
+                    results[i] = (text, scores[j]["confidence"])
 
-        return text.strip(), confidence
+        return results
@@ -0,0 +1,50 @@
+# src/asr/features.py
+"""
+Whisper log-mel features without the 30 s zero-padding STFT.
+
+WhisperFeatureExtractor pads every clip to 30 s before its STFT, so a 2 s
+VAD chunk pays for 30 s of FFTs. Here the STFT runs only over the clip
+itself (through SpectralFrontend) and the padded tail is filled with the
+log-mel floor that all-zero frames would produce, giving the same
+[80, 3000] input the extractor builds.
+"""
+
+import numpy as np
+
+from src.preprocess.frontend import SpectralFrontend
+
+MEL_FLOOR = 1e-10
+
+
+def whisper_log_mel(audios, feature_extractor):
+    """
+    audios: list of 16 kHz float arrays
+    Returns float32 [N, n_mels, nb_max_frames] matching feature_extractor(audios).input_features
+    """
+    n_fft = feature_extractor.n_fft
+    hop = feature_extractor.hop_length
+    max_frames = feature_extractor.nb_max_frames
+    max_samples = feature_extractor.n_samples
+    filters = feature_extractor.mel_filters
+    n_mels = min(filters.shape)
+    pad = n_fft // 2
+
+    out = np.empty((len(audios), n_mels, max_frames), dtype=np.float32)
+    for i, audio in enumerate(audios):
+        audio = np.asarray(audio[:max_samples], dtype=np.float32)
+
+        # Reflect-pad the start like a centered STFT; zeros after the clip
+        # stand in for Whisper's 30 s padding.
+        head = np.pad(audio[1:pad + 1], (0, max(0, pad + 1 - len(audio))))[::-1]
+        x = np.concatenate([head, audio, np.zeros(n_fft, dtype=np.float32)])
+
+        # Frames whose window still touches the clip; the rest are all-zero
+        n = min(max_frames, -(-(len(audio) + pad) // hop))
+        mel = SpectralFrontend(x, 16000, n_fft=n_fft, hop_length=hop, center=False).mel(filters)[:, :n]
+
+        log_spec = np.full((n_mels, max_frames), np.log10(MEL_FLOOR), dtype=np.float32)
+        log_spec[:, :n] = np.log10(np.maximum(mel, MEL_FLOOR))
+        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+        out[i] = (log_spec + 4.0) / 4.0
+
+    return out
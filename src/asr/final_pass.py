@@ -1,6 +1,5 @@
 # src/asr/final_pass.py
-from src.asr.asr_engine import WhisperASR
-from src.postprocess.punctuator import Punctuator
+from src.utils.model_registry import get_whisper_asr, get_punctuator
 from src.utils.audio_io import load_audio
 import json
 import numpy as np
@@ -10,24 +9,26 @@ def final_whisper_pass(audio_path, output_json=None, device="cpu"):
     """
     High-quality ASR + punctuation restoration.
     Runs Whisper-Small on the final target_speaker.wav
+    (full length, in overlapping 30 s windows)
     """
 
     audio, sr = load_audio(audio_path)
 
     # Whisper-Small model
-    asr = WhisperASR(
+    asr = get_whisper_asr(
         model_name_or_path="openai/whisper-small",
         device=device
     )
-    text, conf = asr.transcribe(audio, sr)
+    text, conf, windows = asr.transcribe_long(audio, sr)
 
     # Punctuation restoration
-    p = Punctuator(device=device)
+    p = get_punctuator(device=device)
     final_text = p.restore(text)
 
     result = {
         "text": final_text,
-        "confidence": conf
+        "confidence": conf,
+        "windows": windows
     }
 
     if output_json:
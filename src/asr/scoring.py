@@ -0,0 +1,90 @@
+# src/asr/scoring.py
+"""
+Token-level scoring shared by WhisperASR and TinyWhisperASR.
+
+Per-token log-probabilities come from model.compute_transition_scores
+(one log-softmax over the stacked generation scores), are masked past
+each sequence's EOS on the device, and are copied to NumPy once per batch.
+From those we build token probabilities, word-level confidence (mean
+probability of a word's tokens) and the sequence average used as the
+engines' confidence value.
+"""
+
+import numpy as np
+import torch
+
+
+def generation_logprobs(model, outputs):
+    """
+    Log-probabilities of the generated tokens.
+    outputs: generate(..., return_dict_in_generate=True, output_scores=True)
+    Returns numpy (tokens [B, T], logprobs [B, T], valid [B, T]) where valid
+    marks steps up to and including each sequence's EOS.
+    """
+    if not outputs.scores:
+        empty = np.zeros((outputs.sequences.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32), empty.astype(bool)
+
+    with torch.no_grad():
+        logprobs = model.compute_transition_scores(
+            outputs.sequences, outputs.scores, normalize_logits=True
+        )                                                       # [B, T]
+        tokens = outputs.sequences[:, -logprobs.shape[1]:]
+        is_eos = (tokens == model.generation_config.eos_token_id).long()
+        valid = (is_eos.cumsum(dim=1) - is_eos) == 0
+        logprobs = torch.where(valid, logprobs, torch.zeros_like(logprobs))
+
+    return (
+        tokens.cpu().numpy(),
+        logprobs.float().cpu().numpy(),
+        valid.cpu().numpy(),
+    )
+
+
+def _words(tokenizer, token_ids, probs):
+    """Group text tokens into words (a leading space starts a new word)."""
+    words = []
+    pieces = tokenizer.convert_ids_to_tokens(token_ids)
+    current, current_probs = [], []
+    for piece, p in zip(pieces, probs):
+        starts_word = piece.startswith("Ġ") or piece.startswith(" ")
+        if current and starts_word:
+            words.append((current, current_probs))
+            current, current_probs = [], []
+        current.append(piece)
+        current_probs.append(p)
+    if current:
+        words.append((current, current_probs))
+
+    return [
+        {"word": tokenizer.convert_tokens_to_string(w).strip(), "confidence": float(np.mean(p))}
+        for w, p in words
+    ]
+
+
+def score_sequences(model, tokenizer, outputs):
+    """
+    Per generated sequence:
+        {"tokens": [text token ids],
+         "token_probs": [probability per text token],
+         "words": [{"word", "confidence"}, ...],
+         "confidence": mean token probability over the sequence (incl. EOS)}
+    """
+    tokens, logprobs, valid = generation_logprobs(model, outputs)
+    probs = np.exp(logprobs)
+    eos = model.generation_config.eos_token_id
+
+    results = []
+    for tok, p, ok in zip(tokens, probs, valid):
+        n_valid = int(ok.sum())
+        confidence = float(p[ok].sum() / n_valid) if n_valid else 0.0
+
+        # Text tokens only: prompt, EOS / padding and timestamps sort after EOS
+        text = ok & (tok < eos)
+        results.append({
+            "tokens": tok[text].tolist(),
+            "token_probs": p[text].astype(float).tolist(),
+            "words": _words(tokenizer, tok[text].tolist(), p[text]),
+            "confidence": confidence,
+        })
+    return results
@@ -1,60 +1,209 @@
 # src/diarization/diarizer.py
 
 import numpy as np
-from src.preprocess.vad import segment_audio_by_vad
-from src.speaker.embedder import SpeakerEmbedder
-from src.asr.asr_tiny import TinyWhisperASR
-from src.postprocess.punctuator import Punctuator
+from src.preprocess.vad import segment_audio_by_vad, segment_source_by_vad, SegmentAudio
+from src.utils.audio_io import AudioSource
+from src.utils.model_registry import get_speaker_embedder, get_tiny_asr, get_punctuator
 from src.separation.selector import separate_audio
+from src.speaker.speaker_index import MATCH_THRESHOLD, UNKNOWN_SPEAKER
+from src.utils.stages import StageGraph
 
+DIAR_STREAM_BATCH = 32   # segments per streamed batch (embedding / ASR)
 
-def diarize_and_transcribe(audio, sr, target_audio, target_sr, use_demucs=True):
+
+def _transcribe_mask(embs, query_emb, speaker_index=None, margin=0.0):
+    """
+    Segments worth transcribing in target-only mode: best score at least
+    the match threshold minus margin (per-speaker thresholds with an index).
+    """
+    if speaker_index is not None:
+        indices, scores = speaker_index.search(embs, top_k=1)
+        return speaker_index.passes(indices, scores, margin)[:, 0]
+    return embs @ query_emb >= MATCH_THRESHOLD - margin
+
+
+def diarize_and_transcribe(
+    audio, sr, target_audio, target_sr, use_demucs=True,
+    target_emb=None, speaker_index=None, top_k=1, pool=None,
+    target_only=False, ambiguous_margin=0.0, frame_pooling=False
+):
     """
     Perform:
         - VAD segmentation
         - Speaker embedding matching
         - Chunk ASR
         - Punctuation restoration
+    Pass target_emb (e.g. from the enrollment store) to skip embedding
+    target_audio; target_audio / target_sr may then be None.
+    Pass a SpeakerIndex to label segments with enrolled speaker ids
+    (top_k candidates per segment) instead of Target / Other.
+    audio may be an AudioSource: VAD then runs block by block and each
+    stage reads only the segments it is batching.
+    Pass an InferencePool to shard segment embedding and ASR across worker
+    processes (the audio is shared with them, not pickled).
+    Runs on a StageGraph: VAD overlaps the target embedding, and segment
+    batches stream to embedding and ASR concurrently, so ASR starts on the
+    first batch while later ones are still being embedded.
+    target_only=True transcribes only segments that pass the match
+    threshold (or score within ambiguous_margin below it); ASR then follows
+    embedding batch by batch, and the other segments keep their timestamps
+    with empty text and confidence None.
+    frame_pooling=True runs the WavLM backbone once over the whole
+    recording (in long overlapping windows, alongside VAD) and pools each
+    segment's frames through the x-vector head, instead of one backbone
+    pass per segment. Embedding then stays in this process.
     """
 
-    # 1. VAD
-    print("→ Segmenting with VAD...")
-    segments = segment_audio_by_vad(audio, sr)
-    print(f"→ {len(segments)} VAD chunks found.")
+    # --- stage functions ---
+    def vad(audio, sr):
+        print("→ Segmenting with VAD...")
+        if isinstance(audio, AudioSource):
+            segments = segment_source_by_vad(audio)
+            sr = audio.sr
+        else:
+            segments = segment_audio_by_vad(audio, sr)
+        print(f"→ {len(segments)} VAD chunks found.")
+        return segments, sr
 
-    # 2. Speaker embedder (WavLM)
-    print("→ Loading speaker embedder...")
-    embedder = SpeakerEmbedder()
-    print("→ Extracting target speaker embedding...")
-    target_emb = embedder.embed(target_audio, target_sr)
+    def query(target_audio, target_sr, target_emb):
+        # Runs alongside VAD; nothing to do when an embedding / index is given
+        if target_emb is not None or speaker_index is not None:
+            return target_emb
+        print("→ Extracting target speaker embedding...")
+        if pool is not None:
+            return pool.embed_windowed(target_audio, target_sr)
+        return get_speaker_embedder().embed_windowed(target_audio, target_sr)
 
-    # 3. ASR model (Tiny)
-    asr = TinyWhisperASR(device="cpu")
+    def segment_batches(segments):
+        # With a pool, one batch: workers shard it over a single shared copy
+        step = max(1, len(segments)) if pool is not None else DIAR_STREAM_BATCH
+        for i in range(0, len(segments), step):
+            yield segments[i:i + step]
 
-    # 4. Punctuator
-    punct = Punctuator()
+    owned = []      # shared-memory copies made by this run, released at the end
 
+    def shared_audio(audio):
+        if pool is None:
+            return None
+        # One shared copy per run: workers read segments from it by sample
+        # bounds (an AudioSource is copied block by block, never read whole)
+        shared = pool.share(audio)
+        owned.append(shared)
+        return shared
 
-    diar = []
+    def frame_features(audio, sr):
+        if not frame_pooling:
+            return None
+        print("→ Running the speaker backbone over the full recording...")
+        if isinstance(audio, AudioSource):
+            sr = audio.sr        # read window by window, never fully in memory
+        return get_speaker_embedder().frame_features(audio, sr)
+
+    def embed(batches, sr, shared, frames):
+        for batch in batches:
+            if frames is not None:
+                bounds = [(seg.start_sample, seg.end_sample) for seg in batch]
+                yield batch, get_speaker_embedder().embed_from_frames(frames, bounds, sr)
+            elif pool is not None:
+                bounds = [(seg.start_sample, seg.end_sample) for seg in batch]
+                yield batch, pool.embed_segments(shared, sr, bounds)
+            else:
+                yield batch, get_speaker_embedder().embed_batch(SegmentAudio(batch), sr)
+
+    def collect(embedded):
+        chunks = [embs for _, embs in embedded]
+        return np.concatenate(chunks) if chunks else None
 
-    for idx, seg in enumerate(segments):
-        print(f"--- Processing chunk {idx+1}/{len(segments)} ---")
-
-        # Speaker similarity
-        emb = embedder.embed(seg["audio"], sr)
-        similarity = float(np.dot(emb, target_emb))
-        speaker = "Target" if similarity >= 0.6 else "Other"
-
-        # ASR
-        text, conf = asr.transcribe(seg["audio"], sr)
-        text = punct.restore(text)
-
-        diar.append({
-            "speaker": speaker,
-            "start": float(seg["start"]),
-            "end": float(seg["end"]),
-            "text": text.strip(),
-            "confidence": float(conf)
-        })
+    def asr_batch(batch, sr, shared):
+        if pool is not None:
+            bounds = [(seg.start_sample, seg.end_sample) for seg in batch]
+            return pool.transcribe_segments(shared, sr, bounds)
+        return get_tiny_asr(device="cpu").transcribe_batch(SegmentAudio(batch), sr)
+
+    def transcribe(batches, sr, shared):
+        transcripts = []
+        for batch in batches:
+            transcripts.extend(asr_batch(batch, sr, shared))
+        return transcripts
+
+    def transcribe_selected(embedded, query_emb, sr, shared):
+        # Only segments at or near the match threshold reach ASR; others stay None
+        transcripts = []
+        for batch, embs in embedded:
+            keep = np.flatnonzero(_transcribe_mask(embs, query_emb, speaker_index, ambiguous_margin))
+            out = [None] * len(batch)
+            if len(keep):
+                for i, t in zip(keep, asr_batch([batch[i] for i in keep], sr, shared)):
+                    out[i] = t
+            transcripts.extend(out)
+        n = sum(t is not None for t in transcripts)
+        print(f"→ Target-only: transcribed {n} / {len(transcripts)} chunks.")
+        return transcripts
+
+    def label(seg_embs, query_emb):
+        # Speaker similarity for all chunks (one matmul)
+        if seg_embs is None:
+            return [], None
+        if speaker_index is not None:
+            matches = speaker_index.match(seg_embs, top_k=top_k)
+            return [m[0]["speaker_id"] if m else UNKNOWN_SPEAKER for m in matches], matches
+        similarities = seg_embs @ query_emb
+        return ["Target" if s >= MATCH_THRESHOLD else "Other" for s in similarities], None
+
+    def punctuate(transcripts, speakers):
+        # One pass per speaker stream, re-split per chunk (transcribed chunks only)
+        done = [i for i, t in enumerate(transcripts) if t is not None]
+        texts = [""] * len(transcripts)
+        if not done:
+            return texts
+        print("→ Restoring punctuation...")
+        restored = get_punctuator().restore_batch(
+            [transcripts[i][0] for i in done], group_keys=[speakers[i] for i in done]
+        )
+        for i, text in zip(done, restored):
+            texts[i] = text
+        return texts
+
+    # --- graph: VAD ∥ target embedding, then embedding ∥ ASR over streamed batches ---
+    graph = StageGraph()
+    graph.add("vad", vad, inputs=("audio", "sr"), outputs=("segments", "seg_sr"))
+    graph.add("target_embedding", query,
+              inputs=("target_audio", "target_sr", "target_emb"), outputs=("query_emb",))
+    graph.add("shared_audio", shared_audio, inputs=("audio",), outputs=("shared",))
+    graph.add_stream("segment_batches", segment_batches, inputs=("segments",), output="batches")
+    graph.add("frame_features", frame_features, inputs=("audio", "sr"), outputs=("frames",))
+    graph.add_stream("embed", embed, inputs=("batches", "seg_sr", "shared", "frames"), output="embedded")
+    graph.add("collect_embeddings", collect, inputs=("embedded",), outputs=("seg_embs",))
+    if target_only:
+        # ASR follows embedding batch by batch, only on (near-)target chunks
+        graph.add("asr", transcribe_selected,
+                  inputs=("embedded", "query_emb", "seg_sr", "shared"), outputs=("transcripts",))
+    else:
+        graph.add("asr", transcribe, inputs=("batches", "seg_sr", "shared"), outputs=("transcripts",))
+    graph.add("match", label, inputs=("seg_embs", "query_emb"), outputs=("speakers", "matches"))
+    graph.add("punctuate", punctuate, inputs=("transcripts", "speakers"), outputs=("texts",))
+
+    try:
+        v = graph.run(
+            audio=audio, sr=sr, target_audio=target_audio, target_sr=target_sr, target_emb=target_emb
+        )
+    finally:
+        for shared in owned:
+            shared.release()
+    print(graph.timing_report("Diarization stage timings"))
+
+    diar = []
+    for idx, seg in enumerate(v["segments"]):
+        transcript = v["transcripts"][idx]
+        entry = {
+            "speaker": v["speakers"][idx],
+            "start": seg.start,
+            "end": seg.end,
+            "text": v["texts"][idx].strip(),
+            "confidence": float(transcript[1]) if transcript is not None else None
+        }
+        if v["matches"] is not None:
+            entry["matches"] = v["matches"][idx]
+        diar.append(entry)
 
     return diar
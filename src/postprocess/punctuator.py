@@ -2,14 +2,21 @@
 
 from deepmultilingualpunctuation import PunctuationModel
 
+DEFAULT_PUNCT_MODEL = "oliverguhr/fullstop-punctuation-multilang-large"
+
+
 class Punctuator:
     """
     Offline punctuation restoration using deepmultilingualpunctuation.
     Runs on CPU, no HuggingFace download, works everywhere.
     """
 
-    def __init__(self):
-        self.model = PunctuationModel()
+    def __init__(self, model_name=DEFAULT_PUNCT_MODEL, device="cpu"):
+        # deepmultilingualpunctuation picks its own device (CUDA if present);
+        # device is kept so the model registry can key on it.
+        self.device = device
+        self.model_name = model_name
+        self.model = PunctuationModel(model=model_name)
 
     def restore(self, text: str) -> str:
         text = text.strip()
@@ -18,3 +25,41 @@ class Punctuator:
 
         result = self.model.restore_punctuation(text)
         return result
+
+    def restore_batch(self, texts, group_keys=None):
+        """
+        Punctuate many segment texts with as few model calls as possible.
+
+        Texts sharing a group key (e.g. the speaker label) are joined into
+        one word stream, punctuated in a single windowed predict() pass so
+        the model sees cross-segment context, then split back on the
+        original segment boundaries. With no group keys the whole list is
+        treated as one transcript.
+        Returns a list of punctuated strings aligned with texts.
+        """
+        if group_keys is None:
+            group_keys = [None] * len(texts)
+
+        # Word lists per segment (same cleanup restore_punctuation does)
+        words = [self.model.preprocess(t.strip()) for t in texts]
+
+        groups = {}
+        for i, key in enumerate(group_keys):
+            groups.setdefault(key, []).append(i)
+
+        results = [""] * len(texts)
+        for indices in groups.values():
+            stream = [w for i in indices for w in words[i]]
+            if not stream:
+                continue
+
+            # predict() windows the stream internally: O(words / window) calls
+            prediction = self.model.predict(stream)
+
+            pos = 0
+            for i in indices:
+                n = len(words[i])
+                results[i] = self.model.prediction_to_text(prediction[pos:pos + n])
+                pos += n
+
+        return results
@@ -1,24 +1,182 @@
 import numpy as np
-import librosa
+from scipy import fft as sfft
 
+# ----------------------------------------
+# CONFIG: spectral gating
+# ----------------------------------------
+NOISE_SEC = 0.5          # noise profile estimated from the first 0.5 s
+DENOISE_BLOCK_SEC = 10   # block size used by denoise_audio
 
-def denoise_audio(audio, sr, n_fft=2048, prop_decrease=1.0):
+
+def _hann(n_fft):
+    """Periodic Hann window (same as librosa's default STFT window)."""
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+def _frames(audio, n_fft, hop):
+    """Strided [n_frames, n_fft] view of audio (no copy)."""
+    n = 1 + (len(audio) - n_fft) // hop
+    return np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop][:n]
+
+
+def estimate_noise_profile(audio, sr, n_fft=2048, noise_sec=NOISE_SEC):
     """
-    Pure-Python spectral gating noise reduction.
-    Works on Windows without external libraries.
+    Mean STFT magnitude over the first noise_sec of audio, shape [n_fft // 2 + 1].
+    Frames are centered like librosa.stft (zero padding of n_fft // 2).
+    """
+    hop = n_fft // 4
+    noise_frames = max(1, int(noise_sec * sr / hop))
+    need = (noise_frames - 1) * hop + n_fft
+
+    pad = np.zeros(n_fft // 2, dtype=np.float32)
+    x = np.concatenate([pad, np.asarray(audio[:need], dtype=np.float32), pad])
+    if len(x) < n_fft:
+        x = np.pad(x, (0, n_fft - len(x)))
+
+    frames = _frames(x, n_fft, hop)[:noise_frames]
+    magnitude = np.abs(sfft.rfft(frames * _hann(n_fft), axis=1))
+    return magnitude.mean(axis=0)
+
+
+class StreamingDenoiser:
+    """
+    Block-wise spectral gating with weighted overlap-add.
+
+    Feed audio with process(chunk) and finish with flush(); each call returns
+    the denoised samples that are complete so far. Memory is bounded by the
+    chunk size plus one FFT window of state, independent of stream length.
+
+    The noise profile is estimated from the first noise_sec of the stream
+    (output starts once that much audio has arrived) or can be supplied.
     """
-    # STFT
-    stft = librosa.stft(audio, n_fft=n_fft)
-    magnitude, phase = np.abs(stft), np.angle(stft)
 
-    # Estimate noise from first 0.5 seconds
-    noise_frames = int(0.5 * sr / (n_fft // 4))
+    def __init__(self, sr, n_fft=2048, prop_decrease=1.0, noise_profile=None, noise_sec=NOISE_SEC):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop = n_fft // 4
+        self.prop_decrease = prop_decrease
+        self.noise_sec = noise_sec
+        self.noise_profile = None if noise_profile is None else np.asarray(noise_profile, dtype=np.float32)
+
+        self.window = _hann(n_fft)
+        overlap = n_fft // self.hop
+        # Window-square sum seen by every fully covered sample (periodic in hop)
+        self._wss = (self.window.reshape(overlap, self.hop) ** 2).sum(axis=0)
+
+        noise_frames = max(1, int(noise_sec * sr / self.hop))
+        self._warmup_len = (noise_frames - 1) * self.hop + n_fft // 2
+        self._warmup = []
+        self._warmup_size = 0
+
+        # Leading zeros put a frame every hop from -(n_fft - hop), so each
+        # real sample is covered by all n_fft / hop frames (same frame grid
+        # as a centered STFT, plus one extra frame at the start).
+        self._lead = n_fft - self.hop
+        self._in = np.zeros(self._lead, dtype=np.float32)
+        self._tail = np.zeros(n_fft - self.hop, dtype=np.float32)
+        self._to_trim = self._lead
+        self._total_in = 0
+        self._total_out = 0
+
+    def _gate(self, frames):
+        spec = sfft.rfft(frames * self.window, axis=1)
+        magnitude = np.abs(spec)
+        gated = np.maximum(magnitude - self.prop_decrease * self.noise_profile, 0.0)
+        # Scale the complex bins instead of rebuilding from phase (stays complex64)
+        spec *= gated / np.maximum(magnitude, 1e-10)
+        return sfft.irfft(spec, n=self.n_fft, axis=1) * self.window
+
+    def _run(self, audio):
+        """Process buffered input; returns completed output samples."""
+        x = np.concatenate([self._in, audio]) if len(self._in) else audio
+        if len(x) < self.n_fft:
+            self._in = x
+            return np.zeros(0, dtype=np.float32)
+
+        frames = _frames(x, self.n_fft, self.hop)
+        n = len(frames)
+        self._in = x[n * self.hop:].copy()
+
+        out_frames = self._gate(frames)
+
+        # Overlap-add: each frame is n_fft / hop hop-sized pieces
+        overlap = self.n_fft // self.hop
+        out = np.zeros((n + overlap - 1) * self.hop, dtype=np.float32)
+        out[:len(self._tail)] += self._tail
+        pieces = out_frames.reshape(n, overlap, self.hop)
+        for k in range(overlap):
+            out[k * self.hop:(k + n) * self.hop] += pieces[:, k].reshape(-1)
+
+        done = out[:n * self.hop]
+        self._tail = out[n * self.hop:].copy()
+
+        done = (done.reshape(n, self.hop) / self._wss).reshape(-1)
+
+        if self._to_trim:
+            cut = min(self._to_trim, len(done))
+            done = done[cut:]
+            self._to_trim -= cut
+        return done
+
+    def _emit(self, out):
+        out = out[:max(0, self._total_in - self._total_out)]
+        self._total_out += len(out)
+        return out.astype(np.float32, copy=False)
+
+    def process(self, chunk):
+        """Denoise the next chunk; returns the samples completed so far."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        self._total_in += len(chunk)
+
+        if self.noise_profile is None:
+            self._warmup.append(chunk)
+            self._warmup_size += len(chunk)
+            if self._warmup_size < self._warmup_len:
+                return np.zeros(0, dtype=np.float32)
+            chunk = np.concatenate(self._warmup)
+            self._warmup = []
+            self.noise_profile = estimate_noise_profile(chunk, self.sr, self.n_fft, self.noise_sec)
+
+        return self._emit(self._run(chunk))
+
+    def flush(self):
+        """Finish the stream and return the remaining samples."""
+        if self.noise_profile is None:
+            chunk = np.concatenate(self._warmup) if self._warmup else np.zeros(0, dtype=np.float32)
+            self._warmup = []
+            self.noise_profile = estimate_noise_profile(chunk, self.sr, self.n_fft, self.noise_sec)
+            head = self._run(chunk)
+        else:
+            head = np.zeros(0, dtype=np.float32)
+
+        # Zero padding so every remaining real sample gets full frame coverage
+        tail = self._run(np.zeros(self.n_fft, dtype=np.float32))
+        return self._emit(np.concatenate([head, tail]))
+
+
+def denoise_spectrogram(frontend, prop_decrease=1.0, noise_sec=NOISE_SEC):
+    """
+    Spectral gating on a SpectralFrontend's STFT (no STFT / iSTFT of its own).
+    Returns a new frontend; its .audio is only reconstructed if someone needs it.
+    """
+    magnitude = frontend.magnitude
+    noise_frames = max(1, int(noise_sec * frontend.sr / frontend.hop_length))
     noise_profile = np.mean(magnitude[:, :noise_frames], axis=1, keepdims=True)
 
-    # Apply spectral gating
-    magnitude_denoised = np.maximum(magnitude - prop_decrease * noise_profile, 0.0)
+    gated = np.maximum(magnitude - prop_decrease * noise_profile, 0.0)
+    return frontend.derive(frontend.stft * (gated / np.maximum(magnitude, 1e-10)))
+
+
+def denoise_audio(audio, sr, n_fft=2048, prop_decrease=1.0):
+    """
+    Pure-Python spectral gating noise reduction.
+    Works on Windows without external libraries.
+    Thin wrapper over StreamingDenoiser, run block by block so peak memory
+    does not scale with several full-length spectrograms.
+    """
+    denoiser = StreamingDenoiser(sr, n_fft=n_fft, prop_decrease=prop_decrease)
+    block = int(DENOISE_BLOCK_SEC * sr)
 
-    # Reconstruct
-    denoised_stft = magnitude_denoised * np.exp(1j * phase)
-    denoised_audio = librosa.istft(denoised_stft)
-    return denoised_audio.astype(np.float32)
+    out = [denoiser.process(audio[i:i + block]) for i in range(0, len(audio), block)]
+    out.append(denoiser.flush())
+    return np.concatenate(out).astype(np.float32)
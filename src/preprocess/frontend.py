@@ -0,0 +1,115 @@
+# src/preprocess/frontend.py
+"""
+Shared spectral frontend.
+
+A SpectralFrontend wraps one audio buffer (or an existing STFT) and computes
+the STFT once. Derived views (magnitude, power, per-frame energy, mel power)
+are cached lazily, and the time-domain signal is only rebuilt (iSTFT) when a
+caller asks for .audio. Denoise, VAD and HPSS can all run on the same
+spectrogram instead of each doing their own STFT / iSTFT round trip.
+"""
+
+import numpy as np
+import librosa
+
+
+class SpectralFrontend:
+    def __init__(self, audio, sr, n_fft=2048, hop_length=None, center=True):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length or n_fft // 4
+        self.center = center
+        self.length = len(audio) if audio is not None else None
+
+        self._audio = None if audio is None else np.asarray(audio, dtype=np.float32)
+        self._stft = None
+        self._cache = {}
+
+    @classmethod
+    def from_stft(cls, stft, sr, n_fft, hop_length, length=None, center=True):
+        """Wrap an existing complex spectrogram (no time-domain audio yet)."""
+        fe = cls(None, sr, n_fft=n_fft, hop_length=hop_length, center=center)
+        fe._stft = stft
+        fe.length = length
+        return fe
+
+    def derive(self, stft, length=None):
+        """New frontend with the same STFT parameters over a modified spectrogram."""
+        return SpectralFrontend.from_stft(
+            stft, self.sr, self.n_fft, self.hop_length,
+            length=self.length if length is None else length, center=self.center,
+        )
+
+    # ----------------------------------------
+    # Cached views
+    # ----------------------------------------
+
+    @property
+    def stft(self):
+        """Complex STFT [1 + n_fft // 2, n_frames] (complex64), computed once."""
+        if self._stft is None:
+            self._stft = librosa.stft(
+                self._audio, n_fft=self.n_fft, hop_length=self.hop_length, center=self.center
+            )
+        return self._stft
+
+    @property
+    def n_frames(self):
+        return self.stft.shape[1]
+
+    @property
+    def magnitude(self):
+        if "magnitude" not in self._cache:
+            self._cache["magnitude"] = np.abs(self.stft)
+        return self._cache["magnitude"]
+
+    @property
+    def power(self):
+        if "power" not in self._cache:
+            self._cache["power"] = self.magnitude ** 2
+        return self._cache["power"]
+
+    @property
+    def frame_energy(self):
+        """
+        Window-weighted mean-square energy per STFT frame, via Parseval
+        (no time-domain framing needed).
+        """
+        if "frame_energy" not in self._cache:
+            p = self.power
+            total = 2.0 * p.sum(axis=0) - p[0]
+            if self.n_fft % 2 == 0:
+                total -= p[-1]
+            window = librosa.filters.get_window("hann", self.n_fft, fftbins=True)
+            self._cache["frame_energy"] = total / (self.n_fft * np.sum(window ** 2))
+        return self._cache["frame_energy"]
+
+    def mel(self, mel_filters):
+        """Mel power [n_mels, n_frames]; mel_filters may be [n_freq, n_mels] or [n_mels, n_freq]."""
+        key = ("mel", id(mel_filters))
+        if key not in self._cache:
+            filters = mel_filters if mel_filters.shape[0] != self.power.shape[0] else mel_filters.T
+            self._cache[key] = (filters @ self.power).astype(np.float32)
+        return self._cache[key]
+
+    # ----------------------------------------
+    # Time domain
+    # ----------------------------------------
+
+    @property
+    def audio(self):
+        """Time-domain signal; reconstructed with one iSTFT on first access."""
+        if self._audio is None:
+            self._audio = librosa.istft(
+                self.stft, hop_length=self.hop_length, n_fft=self.n_fft,
+                center=self.center, length=self.length,
+            ).astype(np.float32)
+        return self._audio
+
+    def frames_to_samples(self, frames):
+        return np.asarray(frames) * self.hop_length
+
+    def select_frames(self, frame_idx):
+        """Frontend over a subset of STFT columns (e.g. speech-only frames)."""
+        frame_idx = np.asarray(frame_idx)
+        return self.derive(self.stft[:, frame_idx], length=len(frame_idx) * self.hop_length)
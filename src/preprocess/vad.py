@@ -8,6 +8,10 @@ import librosa
 # ----------------------------------------
 MIN_CHUNK_SEC = 0.30   # 300 ms minimum allowed
 DEFAULT_FRAME_MS = 30
+SPECTRAL_VAD_REL_THRESHOLD = 0.01   # -20 dB below the loudest frame
+ENERGY_VAD_THRESHOLD = 0.002        # absolute frame energy (segment_audio_by_vad)
+VAD_MIN_SPEECH_MS = 300
+VAD_MIN_SILENCE_MS = 300
 
 
 def simple_vad(audio, sr, threshold=0.015, frame_ms=DEFAULT_FRAME_MS):
@@ -23,86 +27,207 @@ def simple_vad(audio, sr, threshold=0.015, frame_ms=DEFAULT_FRAME_MS):
     return bool(np.max(rms) > threshold)
 
 
-def detect_voice_activity(audio, sr, frame_ms=DEFAULT_FRAME_MS, threshold=0.002):
+class VadSegment:
+    """
+    Lightweight speech segment: sample bounds into a source buffer.
+    .audio is a view (no copy) into the source array.
+    """
+    __slots__ = ("start_sample", "end_sample", "sr", "source")
+
+    def __init__(self, start_sample, end_sample, sr, source):
+        self.start_sample = int(start_sample)
+        self.end_sample = int(end_sample)
+        self.sr = sr
+        self.source = source
+
+    @property
+    def start(self):
+        return self.start_sample / self.sr
+
+    @property
+    def end(self):
+        return self.end_sample / self.sr
+
+    @property
+    def audio(self):
+        return self.source[self.start_sample:self.end_sample]
+
+    def __len__(self):
+        return self.end_sample - self.start_sample
+
+    def __repr__(self):
+        return f"VadSegment(start={self.start:.2f}, end={self.end:.2f})"
+
+
+def frame_energy(audio, frame_len):
+    """
+    Mean energy per non-overlapping frame (vectorized).
+    The trailing partial frame is averaged over its own length.
+    """
+    audio = np.asarray(audio)
+    n_full = len(audio) // frame_len
+    full = audio[:n_full * frame_len].reshape(n_full, frame_len)   # view, no copy
+
+    energy = np.einsum("ij,ij->i", full, full) / frame_len
+    tail = audio[n_full * frame_len:]
+    if len(tail):
+        energy = np.append(energy, np.dot(tail, tail) / len(tail))
+    return energy
+
+
+def detect_voice_activity(audio, sr, frame_ms=DEFAULT_FRAME_MS, threshold=ENERGY_VAD_THRESHOLD):
     """
     Simple energy-based VAD.
-    Returns a list of booleans per frame (True = speech)
+    Returns a boolean array per frame (True = speech)
     """
     frame_len = int(sr * frame_ms / 1000)
-    frames = range(0, len(audio), frame_len)
+    vad_marks = frame_energy(audio, frame_len) > threshold
+    return vad_marks, frame_len
 
-    vad_marks = []
-    for start in frames:
-        end = min(start + frame_len, len(audio))
-        frame = audio[start:end]
-        energy = np.mean(frame ** 2)
-        vad_marks.append(energy > threshold)
 
-    return vad_marks, frame_len
+def _speech_runs(vad_marks):
+    """(starts, ends) frame indices of consecutive True runs, ends exclusive."""
+    padded = np.concatenate(([False], np.asarray(vad_marks, dtype=bool), [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
 
 
 def segment_audio_by_vad(
     audio,
     sr,
     frame_ms=DEFAULT_FRAME_MS,
-    threshold=0.002,
-    min_speech_ms=300,
-    min_silence_ms=300
+    threshold=ENERGY_VAD_THRESHOLD,
+    min_speech_ms=VAD_MIN_SPEECH_MS,
+    min_silence_ms=VAD_MIN_SILENCE_MS
 ):
     """
     Convert VAD boolean frames into continuous timestamped speech segments.
-    Returns list of:
-        { "start": sec, "end": sec, "audio": numpy_array }
+    Speech runs separated by less than min_silence_ms are merged; merged
+    regions shorter than min_speech_ms are dropped.
+    Returns list of VadSegment (start / end in sec, .audio is a view).
     """
 
     vad_marks, frame_len = detect_voice_activity(audio, sr, frame_ms, threshold)
-    min_speech_frames = int(min_speech_ms / frame_ms)
-    min_silence_frames = int(min_silence_ms / frame_ms)
-
-    segments = []
-    start_idx = None
-    silence_count = 0
-
-    for i, is_speech in enumerate(vad_marks):
-        if is_speech:
-            if start_idx is None:
-                start_idx = i
-            silence_count = 0
-
-        else:
-            if start_idx is not None:
-                silence_count += 1
-
-                if silence_count >= min_silence_frames:
-                    end_idx = i - silence_count + 1
-
-                    # Only keep long enough speech segments
-                    if (end_idx - start_idx) >= min_speech_frames:
-                        start = start_idx * frame_len
-                        end = end_idx * frame_len
-
-                        # ---- FIX: Skip extremely short chunks ----
-                        if (end - start) / sr >= MIN_CHUNK_SEC:
-                            segments.append({
-                                "start": start / sr,
-                                "end": end / sr,
-                                "audio": audio[start:end].copy()
-                            })
-
-                    start_idx = None
-
-    # Final unfinished speech region
-    if start_idx is not None:
-        end_idx = len(vad_marks)
-        if (end_idx - start_idx) >= min_speech_frames:
-            start = start_idx * frame_len
-            end = len(audio)
-
-            if (end - start) / sr >= MIN_CHUNK_SEC:
-                segments.append({
-                    "start": start / sr,
-                    "end": end / sr,
-                    "audio": audio[start:end].copy()
-                })
-
-    return segments
+    start_samples, end_samples = _marks_to_bounds(
+        vad_marks, frame_len, len(audio), sr,
+        int(min_speech_ms / frame_ms), int(min_silence_ms / frame_ms),
+    )
+    return [VadSegment(s, e, sr, audio) for s, e in zip(start_samples, end_samples)]
+
+
+def _marks_to_bounds(vad_marks, frame_len, n_samples, sr, min_speech_frames, min_silence_frames):
+    """Run-length segment extraction → (start_samples, end_samples) arrays."""
+    n_frames = len(vad_marks)
+    empty = np.zeros(0, dtype=np.int64)
+
+    starts, ends = _speech_runs(vad_marks)
+    if len(starts) == 0:
+        return empty, empty
+
+    # Merge runs whose gap is shorter than the silence needed to close a segment
+    breaks = np.flatnonzero((starts[1:] - ends[:-1]) >= max(min_silence_frames, 1))
+    seg_starts = starts[np.concatenate(([0], breaks + 1))]
+    seg_ends = ends[np.concatenate((breaks, [len(ends) - 1]))]
+
+    # Last region stays open (runs to end of audio) unless enough trailing silence
+    open_tail = (n_frames - seg_ends[-1]) < max(min_silence_frames, 1)
+    if open_tail:
+        seg_ends[-1] = n_frames
+
+    # Only keep long enough speech segments
+    keep = (seg_ends - seg_starts) >= min_speech_frames
+    start_samples = seg_starts * frame_len
+    end_samples = np.minimum(seg_ends * frame_len, n_samples)
+    if open_tail:
+        end_samples[-1] = n_samples
+
+    # ---- Skip extremely short chunks ----
+    keep &= (end_samples - start_samples) / sr >= MIN_CHUNK_SEC
+
+    return start_samples[keep], end_samples[keep]
+
+
+def segment_source_by_vad(
+    source,
+    frame_ms=DEFAULT_FRAME_MS,
+    threshold=ENERGY_VAD_THRESHOLD,
+    min_speech_ms=VAD_MIN_SPEECH_MS,
+    min_silence_ms=VAD_MIN_SILENCE_MS,
+    block_sec=60
+):
+    """
+    segment_audio_by_vad for an AudioSource: frame energies are computed
+    block by block, so only one block of audio is decoded at a time.
+    Returns VadSegment list whose .audio reads the range from the source.
+    """
+    sr = source.sr
+    frame_len = int(sr * frame_ms / 1000)
+    block = max(1, int(block_sec * sr) // frame_len) * frame_len   # frame-aligned
+
+    energies = [frame_energy(source.read_samples(s, s + block), frame_len)
+                for s in range(0, len(source), block)]
+    energy = np.concatenate(energies) if energies else np.zeros(0)
+
+    start_samples, end_samples = _marks_to_bounds(
+        energy > threshold, frame_len, len(source), sr,
+        int(min_speech_ms / frame_ms), int(min_silence_ms / frame_ms),
+    )
+    return [VadSegment(s, e, sr, source) for s, e in zip(start_samples, end_samples)]
+
+
+class SegmentAudio:
+    """
+    Sequence of segment waveforms that reads each one only when indexed,
+    so batch consumers hold one batch of audio at a time.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.lengths = [len(seg) for seg in segments]
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getitem__(self, i):
+        return self.segments[i].audio
+
+
+def segment_frontend_by_vad(
+    frontend,
+    rel_threshold=SPECTRAL_VAD_REL_THRESHOLD,
+    min_speech_ms=VAD_MIN_SPEECH_MS,
+    min_silence_ms=VAD_MIN_SILENCE_MS
+):
+    """
+    VAD on a SpectralFrontend's per-frame energy (one frame per STFT hop),
+    reusing its spectrogram instead of framing the waveform again.
+    rel_threshold is relative to the loudest frame, so the input does not
+    need peak normalization first.
+    Returns list of VadSegment; .audio reads from frontend.audio.
+    """
+    energy = frontend.frame_energy
+    vad_marks = energy > rel_threshold * max(float(energy.max()), 1e-12)
+
+    frame_len = frontend.hop_length
+    frame_ms = 1000 * frame_len / frontend.sr
+    n_samples = frontend.length if frontend.length is not None else len(vad_marks) * frame_len
+
+    start_samples, end_samples = _marks_to_bounds(
+        vad_marks, frame_len, n_samples, frontend.sr,
+        int(min_speech_ms / frame_ms), int(min_silence_ms / frame_ms),
+    )
+    return [
+        VadSegment(s, e, frontend.sr, _LazyAudio(frontend))
+        for s, e in zip(start_samples, end_samples)
+    ]
+
+
+class _LazyAudio:
+    """Slices a frontend's time-domain signal on demand (iSTFT only if used)."""
+    __slots__ = ("frontend",)
+
+    def __init__(self, frontend):
+        self.frontend = frontend
+
+    def __getitem__(self, key):
+        return self.frontend.audio[key]
@@ -1,51 +1,121 @@
 # src/separation/demucs_wrapper.py
+"""
+In-memory Demucs separation.
+
+DemucsEngine loads a pretrained Demucs model once (cached through the model
+registry, see get_demucs) and runs apply_model on tensors directly, so no
+temp files are written or read. Long inputs are processed in chunks of
+DEMUCS_CHUNK_SEC with a linear crossfade over DEMUCS_CHUNK_OVERLAP_SEC, so
+memory stays bounded by the chunk length instead of the recording length.
+"""
+
 import os
-import tempfile
+import threading
 import numpy as np
-from pathlib import Path
+import librosa
 from typing import List, Tuple
 
 try:
     # demucs provides an inference CLI and python API
+    import torch
     from demucs.apply import apply_model
     from demucs.pretrained import get_model
     DEMUCS_AVAILABLE = True
 except Exception:
     DEMUCS_AVAILABLE = False
 
-from ..utils.audio_io import save_audio, pad_audio
+# ----------------------------------------
+# CONFIG: Demucs inference
+# ----------------------------------------
+DEMUCS_MODEL = os.environ.get("DEMUCS_MODEL", "htdemucs")
+DEMUCS_THREADS = int(os.environ.get("DEMUCS_THREADS", 0))   # 0 = torch default
+DEMUCS_CHUNK_SEC = 60.0          # audio per apply_model call (bounds memory)
+DEMUCS_CHUNK_OVERLAP_SEC = 2.0   # crossfade between chunks
+DEMUCS_SHIFTS = 1
+DEMUCS_SEGMENT_OVERLAP = 0.25    # apply_model's own overlap between its segments
+
+
+class DemucsEngine:
+    def __init__(self, model_name=DEMUCS_MODEL, device="cpu", threads=DEMUCS_THREADS):
+        if not DEMUCS_AVAILABLE:
+            raise RuntimeError("Demucs not available")
+
+        self.model_name = model_name
+        self.device = device
+        self.threads = threads
+        self.model = get_model(model_name).to(device).eval()
+        self.sources = list(self.model.sources)
+        self.samplerate = self.model.samplerate
+        self.channels = self.model.audio_channels
+
+        # torch thread count is process-wide: one separation at a time
+        self._lock = threading.Lock()
+
+    def _apply(self, chunk):
+        """[S, T] mono sources for one normalized chunk at the model rate."""
+        wav = torch.from_numpy(np.tile(chunk, (self.channels, 1)))[None]
+        with torch.no_grad():
+            out = apply_model(
+                self.model, wav, device=self.device, shifts=DEMUCS_SHIFTS,
+                split=True, overlap=DEMUCS_SEGMENT_OVERLAP, progress=False,
+            )[0]
+        return out.mean(dim=1).cpu().numpy()
+
+    def separate(self, audio, sr, chunk_sec=DEMUCS_CHUNK_SEC, overlap_sec=DEMUCS_CHUNK_OVERLAP_SEC):
+        """
+        Separate mono audio into the model's sources.
+        Returns {source name: mono float32 array at sr, same length as audio}.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        x = audio
+        if sr != self.samplerate:
+            x = librosa.resample(audio, orig_sr=sr, target_sr=self.samplerate)
+
+        # Same normalization as the demucs CLI
+        mean, std = float(x.mean()), float(x.std()) + 1e-8
+        x = (x - mean) / std
+
+        n = len(x)
+        chunk = max(1, int(chunk_sec * self.samplerate))
+        overlap = min(int(overlap_sec * self.samplerate), chunk // 4)
+        ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+        out = np.zeros((len(self.sources), n), dtype=np.float32)
+
+        with self._lock:
+            prev_threads = torch.get_num_threads()
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            try:
+                start = 0
+                while True:
+                    end = min(n, start + chunk)
+                    y = self._apply(x[start:end])
+                    # Complementary linear fades: overlapping weights sum to 1
+                    if overlap and start > 0:
+                        y[:, :overlap] *= ramp
+                    if overlap and end < n:
+                        y[:, -overlap:] *= ramp[::-1]
+                    out[:, start:end] += y
+                    if end == n:
+                        break
+                    start = end - overlap
+            finally:
+                torch.set_num_threads(prev_threads)
+
+        out = out * std + mean
+        results = {}
+        for name, y in zip(self.sources, out):
+            if sr != self.samplerate:
+                y = librosa.resample(y, orig_sr=self.samplerate, target_sr=sr)
+            results[name] = librosa.util.fix_length(y, size=len(audio)).astype(np.float32)
+        return results
+
 
-def demucs_separate(audio: np.ndarray, sr: int, model_name: str = "htdemucs") -> List[Tuple[np.ndarray,int]]:
+def demucs_separate(audio: np.ndarray, sr: int, model_name: str = DEMUCS_MODEL) -> List[Tuple[np.ndarray, int]]:
     """
-    Use Demucs to perform separation. Returns list of numpy arrays (sources).
-    If demucs is not available, raises RuntimeError.
+    Use Demucs to perform separation. Returns list of (source, sr) pairs in
+    the model's source order. If demucs is not available, raises RuntimeError.
     """
-    if not DEMUCS_AVAILABLE:
-        raise RuntimeError("Demucs not available")
-
-    # demucs expects files; write a temp wav
-    import soundfile as sf
-    tmpdir = tempfile.mkdtemp(prefix="demucs_tmp_")
-    in_path = os.path.join(tmpdir, "input.wav")
-    sf.write(in_path, audio, sr)
-
-    model = get_model(model_name)
-    # apply_model returns tuple (sources, rates) for each segment; use single file call
-    sources = apply_model(model, in_path, tmpdir, shifts=1, overlap=0.25, device='cpu')
-
-    # apply_model can save to disk; we'll try to load the output folder
-    out_dir = os.path.join(tmpdir, "separated")
-    results = []
-    if os.path.isdir(out_dir):
-        # demucs writes per-source wavs; load them
-        for f in sorted(os.listdir(out_dir)):
-            if f.endswith(".wav"):
-                path = os.path.join(out_dir, f)
-                import soundfile as sf
-                y, r = sf.read(path)
-                # ensure mono float32
-                if y.ndim > 1:
-                    y = y.mean(axis=1)
-                results.append((y.astype("float32"), r))
-    # cleanup optional: keep tmpdir for debugging; you can remove if desired
-    return results
+    from src.utils.model_registry import get_demucs
+    sources = get_demucs(model_name).separate(audio, sr)
+    return [(y, sr) for y in sources.values()]
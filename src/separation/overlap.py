@@ -0,0 +1,116 @@
+# src/separation/overlap.py
+"""
+Overlap-gated separation.
+
+Most conversational speech has one active speaker, so separating the whole
+speech stream wastes the separator on audio that does not need it. Here the
+speech is embedded in short sub-windows (one backbone pass, pooled per
+sub-window), regions where neighbouring sub-window embeddings disagree are
+flagged as likely overlap, and only those regions are separated. Outside
+them every sub-window hop is assigned to the target or the other stream by
+its embedding; inside them the separated component closer to the target
+goes to the target stream. Both streams keep time order.
+
+The dispersion cue also fires on plain speaker turns, which only costs a
+few extra separated seconds; OVERLAP_MAX_FRACTION caps the separated share.
+"""
+
+import numpy as np
+from src.utils.model_registry import get_speaker_embedder
+from src.speaker.speaker_index import MATCH_THRESHOLD
+from src.separation.selector import separate_audio
+
+# ----------------------------------------
+# CONFIG: overlap detection
+# ----------------------------------------
+OVERLAP_WINDOW_SEC = 1.0      # sub-window embedded for the dispersion cue
+OVERLAP_HOP_SEC = 0.5
+OVERLAP_DISPERSION = 0.1      # 1 - |mean of neighbouring embeddings| above this = overlap
+OVERLAP_MAX_FRACTION = 0.25   # at most this share of sub-windows is separated
+OVERLAP_PAD_SEC = 0.25        # context added around each region before separating
+
+
+def subwindow_embeddings(audio, sr, window_sec=OVERLAP_WINDOW_SEC, hop_sec=OVERLAP_HOP_SEC):
+    """
+    Sample bounds [N, 2] of sub-windows covering audio and their embeddings
+    [N, D], from one backbone pass (SpeakerEmbedder.frame_features).
+    """
+    n = len(audio)
+    win = min(int(window_sec * sr), n)
+    hop = max(1, int(hop_sec * sr))
+    starts = list(range(0, max(n - win, 0) + 1, hop))
+    if starts[-1] + win < n:
+        starts.append(n - win)
+    bounds = np.array([(s, s + win) for s in starts], dtype=np.int64)
+
+    embedder = get_speaker_embedder()
+    embs = embedder.embed_from_frames(embedder.frame_features(audio, sr), bounds, sr)
+    return bounds, embs
+
+
+def dispersion(embs, context=1):
+    """Per sub-window: 1 - norm of the mean embedding over ±context neighbours."""
+    n = len(embs)
+    out = np.zeros(n, dtype=np.float32)
+    for i in range(n):
+        block = embs[max(0, i - context):i + context + 1]
+        out[i] = 1.0 - np.linalg.norm(block.mean(axis=0))
+    return out
+
+
+def overlap_regions(bounds, embs, n_samples, sr, threshold=OVERLAP_DISPERSION,
+                    max_fraction=OVERLAP_MAX_FRACTION, pad_sec=OVERLAP_PAD_SEC):
+    """Merged (start, end) sample ranges likely to contain overlapping speech."""
+    if len(bounds) < 2:
+        return []
+    scores = dispersion(embs)
+    flagged = np.flatnonzero(scores >= threshold)
+    cap = int(max_fraction * len(bounds))
+    if len(flagged) > cap:
+        flagged = flagged[np.argsort(-scores[flagged], kind="stable")[:cap]]
+
+    pad = int(pad_sec * sr)
+    regions = []
+    for i in sorted(flagged):
+        start = max(0, int(bounds[i, 0]) - pad)
+        end = min(n_samples, int(bounds[i, 1]) + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], end)
+        else:
+            regions.append([start, end])
+    return [tuple(r) for r in regions]
+
+
+def splice_separated(audio, sr, bounds, embs, regions, target_emb, prefer_demucs=False):
+    """
+    Separate only the overlap regions and splice the results into two
+    streams. Returns (target_stream, other_stream).
+    """
+    embedder = get_speaker_embedder()
+    n = len(audio)
+    hop = int(bounds[1, 0] - bounds[0, 0]) if len(bounds) > 1 else n
+    centres = bounds.mean(axis=1)
+    is_target = embs @ target_emb >= MATCH_THRESHOLD
+
+    target, other = [], []
+    pos = 0
+    for start, end in list(regions) + [(n, n)]:
+        # --- 1) Single-speaker audio before the region: assign hop by hop ---
+        for b in range(pos, start, hop):
+            e = min(b + hop, start)
+            j = int(np.argmin(np.abs(centres - (b + e) / 2)))
+            (target if is_target[j] else other).append(audio[b:e])
+
+        # --- 2) Overlap region: separate, target-like component to the target stream ---
+        if end > start:
+            sources = separate_audio(audio[start:end], sr, prefer_demucs=prefer_demucs)[:2]
+            sims = embedder.embed_batch(sources, sr) @ target_emb
+            first = int(np.argmax(sims))
+            target.append(np.asarray(sources[first], dtype=np.float32))
+            other.append(np.asarray(sources[1 - first], dtype=np.float32))
+        pos = end
+
+    def join(parts):
+        return np.concatenate(parts).astype(np.float32) if parts else np.zeros(0, dtype=np.float32)
+
+    return join(target), join(other)
@@ -1,9 +1,11 @@
 # src/separation/selector.py
 
+import numpy as np
 from .separator import simple_hpss_separation
 
 try:
-    from .demucs_wrapper import demucs_separate, DEMUCS_AVAILABLE
+    from .demucs_wrapper import DEMUCS_AVAILABLE
+    from src.utils.model_registry import get_demucs
 except:
     DEMUCS_AVAILABLE = False
 
@@ -12,15 +14,20 @@ def separate_audio(audio, sr, prefer_demucs=True):
     """
     Use Demucs if installed, fallback to HPSS if not.
     Returns a list of separated sources.
+    With Demucs: [vocals, everything else]; the model stays loaded in the
+    model registry between calls.
     """
 
     if prefer_demucs and DEMUCS_AVAILABLE:
         try:
-            outs = demucs_separate(audio, sr)
+            outs = get_demucs().separate(audio, sr)
+            if "vocals" in outs:
+                rest = np.sum([y for name, y in outs.items() if name != "vocals"], axis=0)
+                return [outs["vocals"], rest.astype(np.float32)]
             if len(outs) >= 2:
-                return [outs[0][0], outs[1][0]]
-        except:
-            pass
+                return list(outs.values())[:2]
+        except Exception as e:
+            print(f"→ Demucs failed ({e}); falling back to HPSS")
 
     # fallback if demucs fails
     s1, s2 = simple_hpss_separation(audio, sr)
@@ -2,11 +2,24 @@ import numpy as np
 import librosa
 
 
-def simple_hpss_separation(audio, sr):
+def hpss_spectrogram(frontend, **kwargs):
+    """
+    HPSS on a SpectralFrontend's STFT.
+    Returns (harmonic, percussive) frontends; audio is rebuilt only on access.
+    """
+    harmonic, percussive = librosa.decompose.hpss(frontend.stft, **kwargs)
+    return frontend.derive(harmonic), frontend.derive(percussive)
+
+
+def simple_hpss_separation(audio, sr, frontend=None):
     """
     Simple HPSS-based separation that works on Windows.
     HPSS returns harmonic & percussive components of the waveform.
+    Pass a SpectralFrontend to reuse its STFT instead of computing a new one.
     """
+    if frontend is not None:
+        harmonic, percussive = hpss_spectrogram(frontend)
+        return harmonic.audio, percussive.audio
 
     # Ensure float32 audio
     audio = audio.astype(np.float32)
@@ -5,24 +5,69 @@ Uses AutoFeatureExtractor because WavLMFeatureExtractor is deprecated /
 removed in new Transformers releases.
 """
 
+import hashlib
+import threading
+from collections import OrderedDict
+
 import torch
 import numpy as np
 import librosa
 from transformers import AutoFeatureExtractor, WavLMForXVector
 
+from src.utils.batching import length_sorted_batches, item_lengths
+from src.utils.backends import apply_embedder_backend
+
+# ----------------------------------------
+# CONFIG: batched embedding
+# ----------------------------------------
+EMBEDDER_MODEL = "microsoft/wavlm-base-plus-sv"
+EMBED_BATCH_SIZE = 16
+EMBED_MAX_BATCH_SEC = 120    # cap on padded audio per forward pass
+
+# ----------------------------------------
+# CONFIG: sub-window embedding (long audio)
+# ----------------------------------------
+EMBED_WINDOW_SEC = 4.0       # sub-window length
+EMBED_WINDOW_OVERLAP_SEC = 1.0
+EMBED_MIN_WINDOW_SEC = 1.0   # shorter trailing windows are dropped
+EMBED_MAX_WINDOWS = 16       # cost cap: at most this many windows per embedding
+EMBED_CACHE_WINDOWS = 4096   # per-window embeddings kept for reuse
+EMBED_STOP_CHUNK = 4         # windows per convergence check (early_stop_tol)
+
+# ----------------------------------------
+# CONFIG: frame pooling (one backbone pass per recording)
+# ----------------------------------------
+FRAME_WINDOW_SEC = 30.0      # backbone window over the full recording
+FRAME_OVERLAP_SEC = 4.0      # frames in the overlap come from the nearer window centre
+FRAME_HOP = 320              # WavLM frame rate: 16 kHz / 320 = 50 frames per second
+
+
+def _coarse_to_fine(n):
+    """Indices 0..n-1 in bit-reversed order (every prefix is spread evenly)."""
+    bits = max(1, (n - 1).bit_length())
+    rev = [int(format(i, f"0{bits}b")[::-1], 2) for i in range(n)]
+    return np.argsort(rev, kind="stable")
+
 
 class SpeakerEmbedder:
-    def __init__(self, device="cpu"):
+    def __init__(self, device="cpu", batch_size=EMBED_BATCH_SIZE, backend="eager"):
         self.device = device
+        self.batch_size = batch_size
+        self.backend = backend      # eager | int8 | torchscript | onnx
 
         # Microsoft WavLM speaker verification model
-        self.model_name = "microsoft/wavlm-base-plus-sv"
+        self.model_name = EMBEDDER_MODEL
 
         # AutoFeatureExtractor works for all versions of Transformers
         self.extractor = AutoFeatureExtractor.from_pretrained(self.model_name)
 
         # Load model
         self.model = WavLMForXVector.from_pretrained(self.model_name).to(self.device)
+        self.model = apply_embedder_backend(self.model, backend, self.model_name)
+
+        # Per-window embedding cache (content hash → embedding), LRU
+        self._window_cache = OrderedDict()
+        self._window_cache_lock = threading.Lock()
 
     def _preprocess(self, audio, sr):
         """
@@ -38,6 +83,7 @@ class SpeakerEmbedder:
             return_tensors="pt",
             padding=True
         ).to(self.device)
+        inputs["input_values"] = inputs["input_values"].to(self.model.dtype)
 
         return inputs
 
@@ -51,9 +97,263 @@ class SpeakerEmbedder:
         with torch.no_grad():
             emb = self.model(**inputs).embeddings  # [1, 768]
 
-        emb = emb.cpu().numpy()[0]
+        emb = emb.float().cpu().numpy()[0]
 
         # L2 normalize (important for cosine similarity)
         emb = emb / (np.linalg.norm(emb) + 1e-8)
 
         return emb
+
+    # Names used by the offline scripts (long streams: bounded sub-window cost)
+    def compute_embedding(self, audio, sr):
+        return self.embed_windowed(audio, sr)
+
+    @staticmethod
+    def cosine_similarity(a, b):
+        """Cosine similarity of two embeddings (a dot product once L2-normalized)."""
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-8))
+
+    def embed_batch(self, segments, sr, batch_size=None):
+        """
+        Compute embeddings for many segments at once.
+
+        Segments are bucketed by length, zero-padded with an attention mask
+        so padding is excluded from pooling, and run batch_size at a time.
+        Returns an (N, D) float32 matrix of L2-normalized rows, in input order.
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        dim = self.model.config.xvector_output_dim
+        if len(segments) == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+
+        if sr != 16000:
+            segments = [librosa.resample(s, orig_sr=sr, target_sr=16000) for s in segments]
+            sr = 16000
+
+        batches = length_sorted_batches(
+            item_lengths(segments),
+            batch_size,
+            max_batch_samples=int(EMBED_MAX_BATCH_SEC * sr),
+        )
+
+        out = np.zeros((len(segments), dim), dtype=np.float32)
+        for idx in batches:
+            inputs = self.extractor(
+                [segments[i] for i in idx],
+                sampling_rate=sr,
+                return_tensors="pt",
+                padding=True,
+                return_attention_mask=True
+            ).to(self.device)
+            inputs["input_values"] = inputs["input_values"].to(self.model.dtype)
+
+            with torch.no_grad():
+                emb = self.model(**inputs).embeddings   # [B, D]
+
+            out[idx] = emb.float().cpu().numpy()
+
+        # L2 normalize rows
+        out /= (np.linalg.norm(out, axis=1, keepdims=True) + 1e-8)
+        return out
+
+    def _cached_windows(self, windows):
+        """Embeddings for 16 kHz windows, computing only the ones not cached."""
+        keys = [hashlib.blake2b(np.ascontiguousarray(w).tobytes(), digest_size=16).digest()
+                for w in windows]
+        out = [None] * len(windows)
+        with self._window_cache_lock:
+            for i, k in enumerate(keys):
+                if k in self._window_cache:
+                    self._window_cache.move_to_end(k)
+                    out[i] = self._window_cache[k]
+
+        missing = [i for i, e in enumerate(out) if e is None]
+        if missing:
+            embs = self.embed_batch([windows[i] for i in missing], 16000)
+            with self._window_cache_lock:
+                for i, emb in zip(missing, embs):
+                    out[i] = emb
+                    self._window_cache[keys[i]] = emb
+                while len(self._window_cache) > EMBED_CACHE_WINDOWS:
+                    self._window_cache.popitem(last=False)
+        return np.stack(out)
+
+    def embed_windowed(
+        self,
+        audio,
+        sr,
+        window_sec=EMBED_WINDOW_SEC,
+        overlap_sec=EMBED_WINDOW_OVERLAP_SEC,
+        max_windows=EMBED_MAX_WINDOWS,
+        early_stop_tol=None,
+    ):
+        """
+        Embedding of arbitrarily long audio at bounded cost.
+
+        The audio is cut into window_sec windows (overlap_sec apart), at most
+        max_windows of them spread evenly over the signal, embedded in
+        batches and combined with a length-weighted mean. Window embeddings
+        are cached by content, so overlapping requests reuse them. With
+        early_stop_tol, windows are embedded EMBED_STOP_CHUNK at a time in
+        coarse-to-fine order over the signal, stopping once the running
+        mean moves by less than that (1 - cosine) between chunks.
+        Returns an L2-normalized embedding like embed().
+        """
+        if sr != 16000:
+            audio = librosa.resample(np.asarray(audio, dtype=np.float32), orig_sr=sr, target_sr=16000)
+            sr = 16000
+
+        win = int(window_sec * sr)
+        if len(audio) <= win:
+            return self.embed(audio, sr)
+
+        # --- 1) Window grid (a trailing window under EMBED_MIN_WINDOW_SEC is dropped) ---
+        n = len(audio)
+        step = max(1, win - int(overlap_sec * sr))
+        starts = [s for s in range(0, n - win + step, step)
+                  if s == 0 or n - s >= EMBED_MIN_WINDOW_SEC * sr]
+        if max_windows and len(starts) > max_windows:
+            pick = np.linspace(0, len(starts) - 1, max_windows).round().astype(int)
+            starts = [starts[i] for i in pick]
+
+        windows = [audio[s:s + win] for s in starts]
+        weights = np.array([len(w) for w in windows], dtype=np.float64)
+
+        # --- 2) Batched embedding, length-weighted running mean ---
+        chunk = self.batch_size
+        if early_stop_tol is not None:
+            # Small chunks, each spread over the whole signal, so a partial
+            # mean already represents all of it
+            chunk = EMBED_STOP_CHUNK
+            order = _coarse_to_fine(len(windows))
+            windows = [windows[i] for i in order]
+            weights = weights[order]
+
+        total = 0.0
+        running = None
+        for b in range(0, len(windows), chunk):
+            embs = self._cached_windows(windows[b:b + chunk])
+            total = total + (embs * weights[b:b + chunk, None]).sum(axis=0)
+
+            new = total / (np.linalg.norm(total) + 1e-8)
+            converged = (
+                early_stop_tol is not None and running is not None
+                and 1.0 - float(np.dot(running, new)) < early_stop_tol
+            )
+            running = new
+            if converged:
+                break
+
+        return running.astype(np.float32)
+
+    # ----------------------------------------
+    # Frame pooling: backbone once, x-vector head per segment
+    # ----------------------------------------
+
+    def _combine_layers(self, out):
+        """Backbone output → [B, T, D] features the x-vector head consumes."""
+        if self.model.config.use_weighted_layer_sum:
+            hidden = torch.stack(out.hidden_states, dim=1)
+            weights = torch.softmax(self.model.layer_weights, dim=-1)
+            return (hidden * weights.view(-1, 1, 1)).sum(dim=1)
+        return out.last_hidden_state
+
+    def _read_window(self, audio, sr, start, end):
+        """16 kHz samples [start, end) of an array or an AudioSource at sr."""
+        if sr == 16000:
+            return np.asarray(audio[start:min(end, len(audio))], dtype=np.float32)
+        s, e = int(start * sr / 16000), min(len(audio), int(np.ceil(end * sr / 16000)))
+        block = np.asarray(audio[s:e], dtype=np.float32)
+        return librosa.resample(block, orig_sr=sr, target_sr=16000)[:end - start]
+
+    def frame_features(self, audio, sr, window_sec=FRAME_WINDOW_SEC, overlap_sec=FRAME_OVERLAP_SEC):
+        """
+        Projected frame features [n_frames, P] (float16, 50 frames / s) for
+        a whole recording, from one backbone forward per window_sec window.
+        audio may be an array or an AudioSource (read window by window).
+        The x-vector projector runs per window (it is frame-wise), so only
+        its smaller output is kept. Windows overlap by overlap_sec; each
+        overlap is split at its middle so every frame comes from the window
+        it sits deeper in. Inputs shorter than one conv frame (400 samples)
+        give no frames.
+        Note: input normalization is per window, not per segment.
+        """
+        n = int(len(audio) * 16000 / sr)
+        dim = self.model.config.tdnn_dim[0]
+        if n < 400:
+            return np.zeros((0, dim), dtype=np.float16)
+
+        win = max(FRAME_HOP, int(window_sec * 16000) // FRAME_HOP * FRAME_HOP)
+        step = max(FRAME_HOP, win - int(overlap_sec * 16000) // FRAME_HOP * FRAME_HOP)
+        n_frames = int(self.model._get_feat_extract_output_lengths(torch.tensor(n)))
+
+        # Last window reaches the end of the recording (and is longer than
+        # the overlap, so never shorter than one conv frame)
+        starts = [0]
+        while starts[-1] + win < n:
+            starts.append(starts[-1] + step)
+
+        feats = np.zeros((n_frames, dim), dtype=np.float16)
+        half = (win - step) // FRAME_HOP // 2
+        for k, s in enumerate(starts):
+            inputs = self._preprocess(self._read_window(audio, sr, s, s + win), 16000)
+            with torch.no_grad():
+                out = self.model.wavlm(
+                    inputs["input_values"], output_hidden_states=True, return_dict=True
+                )
+                h = self.model.projector(self._combine_layers(out))[0]
+                h = h.float().cpu().numpy()
+
+            f0 = s // FRAME_HOP
+            skip = half if k > 0 else 0
+            h = h[skip:n_frames - f0]
+            feats[f0 + skip:f0 + skip + len(h)] = h
+        return feats
+
+    def _head_context(self):
+        """Frames the TDNN stack consumes beyond its output length."""
+        cfg = self.model.config
+        return sum((k - 1) * d for k, d in zip(cfg.tdnn_kernel, cfg.tdnn_dilation))
+
+    def embed_from_frames(self, feats, bounds, sr=16000):
+        """
+        x-vectors [N, D] (L2-normalized) for (start, end) sample bounds at sr,
+        pooling only each segment's frames of frame_features() through the
+        TDNN / statistics-pooling head (the projector already ran). Segments
+        shorter than the TDNN context are widened around their centre.
+        """
+        dim = self.model.config.xvector_output_dim
+        out = np.zeros((len(bounds), dim), dtype=np.float32)
+        if len(bounds) == 0 or len(feats) == 0:
+            return out
+
+        min_frames = self._head_context() + 2       # std needs two output frames
+        scale = 16000 / (sr * FRAME_HOP)
+        n_frames = len(feats)
+        model = self.model
+
+        with torch.no_grad():
+            for i, (start, end) in enumerate(bounds):
+                f0 = int(start * scale)
+                f1 = min(n_frames, max(f0 + 1, int(np.ceil(end * scale))))
+                if f1 - f0 < min_frames:
+                    pad = min_frames - (f1 - f0)
+                    f0 = max(0, f0 - pad // 2)
+                    f1 = min(n_frames, f0 + min_frames)
+                    f0 = max(0, f1 - min_frames)
+
+                h = torch.from_numpy(feats[f0:f1].astype(np.float32)).unsqueeze(0)
+                h = h.to(self.device, model.dtype)
+                for tdnn in model.tdnn:
+                    h = tdnn(h)
+                stats = torch.cat([h.mean(dim=1), h.std(dim=1)], dim=-1)
+                out[i] = model.feature_extractor(stats)[0].float().cpu().numpy()
+
+        out /= (np.linalg.norm(out, axis=1, keepdims=True) + 1e-8)
+        return out
+
+    def embed_segments_pooled(self, audio, sr, bounds):
+        """frame_features once over audio, then one pooled x-vector per (start, end)."""
+        return self.embed_from_frames(self.frame_features(audio, sr), bounds, sr)
@@ -0,0 +1,203 @@
+# src/speaker/embedding_store.py
+"""
+Persistent store of enrolled speaker embeddings.
+
+Layout on disk (under root_dir):
+    embeddings.<version>.npy   float32 matrix [N, D], opened with mmap_mode="r"
+    index.json                 {"dim": D, "matrix": "embeddings.<version>.npy",
+                                "rows": [speaker_id per row],
+                                "speakers": {speaker_id: {"row": i, ...}}}
+
+Lookups are a dict hit plus one memory-mapped row read. A write saves the
+new matrix under a fresh version name and then commits it with a single
+os.replace of index.json, so readers always see a matrix together with the
+ids it was written with. _load checks the rows against the matrix shape.
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__ + "/../.."))
+DEFAULT_STORE_DIR = os.environ.get(
+    "SPEAKER_STORE_DIR", os.path.join(PROJECT_ROOT, "data", "speakers")
+)
+
+
+class EmbeddingStore:
+    def __init__(self, root_dir=DEFAULT_STORE_DIR):
+        self.root_dir = root_dir
+        self.index_path = os.path.join(root_dir, "index.json")
+        os.makedirs(root_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._matrix = None
+        self.dim = None
+        self.speakers = {}
+        self.version = None         # changes on every committed write
+        self._load()
+
+    def _load(self, retries=3):
+        self._matrix = None
+        self.dim = None
+        self.speakers = {}
+        self.version = None
+        for attempt in range(retries):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except FileNotFoundError:
+                return
+            # Stores written before versioned matrices used a fixed name
+            matrix_file = os.path.join(self.root_dir, index.get("matrix", "embeddings.npy"))
+            try:
+                matrix = np.load(matrix_file, mmap_mode="r")
+                break
+            except FileNotFoundError:
+                # Another process committed a newer version and removed this one
+                if attempt == retries - 1:
+                    raise
+        else:
+            return
+
+        speakers = index.get("speakers", {})
+        rows = index.get("rows") or sorted(speakers, key=lambda k: speakers[k]["row"])
+        if (matrix.shape[0] != len(rows) or set(rows) != set(speakers)
+                or any(speakers[sid]["row"] != i for i, sid in enumerate(rows))):
+            raise ValueError(
+                f"Embedding store {self.root_dir} is inconsistent: "
+                f"{matrix.shape[0]} matrix rows for {len(speakers)} speakers"
+            )
+        self.dim = index.get("dim")
+        self.speakers = speakers
+        self._matrix = matrix
+        self.version = index.get("matrix", "embeddings.npy")
+
+    def _matrix_files(self):
+        return [f for f in os.listdir(self.root_dir)
+                if f.startswith("embeddings.") and f.endswith(".npy")]
+
+    def _remove_matrices(self, keep=None):
+        for name in self._matrix_files():
+            if name != keep:
+                try:
+                    os.remove(os.path.join(self.root_dir, name))
+                except OSError:
+                    pass        # still mapped (Windows); removed on a later write
+
+    def _write(self, matrix, speakers):
+        """Save a new matrix version, commit it with one index replace, reopen."""
+        matrix_name = f"embeddings.{time.time_ns():x}.{os.getpid()}.npy"
+        np.save(os.path.join(self.root_dir, matrix_name), np.ascontiguousarray(matrix, dtype=np.float32))
+
+        rows = sorted(speakers, key=lambda k: speakers[k]["row"])
+        tmp_index = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": int(matrix.shape[1]),
+                "matrix": matrix_name,
+                "rows": rows,
+                "speakers": speakers,
+            }, f, indent=2)
+
+        # Single commit point: index.json names the matrix it belongs to
+        os.replace(tmp_index, self.index_path)
+
+        # Release the old map first (required on Windows before deleting)
+        self._matrix = None
+        self._load()
+        self._remove_matrices(keep=matrix_name)
+
+    def __contains__(self, speaker_id):
+        return speaker_id in self.speakers
+
+    def __len__(self):
+        return len(self.speakers)
+
+    def get(self, speaker_id):
+        """Embedding for speaker_id (float32 [D]) or None if not enrolled."""
+        with self._lock:
+            entry = self.speakers.get(speaker_id)
+            if entry is None:
+                return None
+            return np.array(self._matrix[entry["row"]], dtype=np.float32)
+
+    def matrix(self):
+        """(speaker_ids, read-only [N, D] memory-mapped matrix) in row order."""
+        with self._lock:
+            ids = sorted(self.speakers, key=lambda k: self.speakers[k]["row"])
+            if self._matrix is None:
+                return ids, np.zeros((0, self.dim or 0), dtype=np.float32)
+            return ids, self._matrix
+
+    def add(self, speaker_id, embedding, **meta):
+        """Enroll (or re-enroll) a speaker. embedding should be L2-normalized."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+        with self._lock:
+            if self.dim is not None and embedding.shape[0] != self.dim:
+                raise ValueError(
+                    f"Embedding dim {embedding.shape[0]} does not match store dim {self.dim}"
+                )
+
+            speakers = dict(self.speakers)
+            if self._matrix is None:
+                matrix = embedding[None, :]
+                row = 0
+            elif speaker_id in speakers:
+                matrix = np.array(self._matrix)
+                row = speakers[speaker_id]["row"]
+                matrix[row] = embedding
+            else:
+                matrix = np.vstack([self._matrix, embedding[None, :]])
+                row = matrix.shape[0] - 1
+
+            speakers[speaker_id] = {"row": row, "enrolled": time.time(), **meta}
+            self._write(matrix, speakers)
+
+    def remove(self, speaker_id):
+        """Delete a speaker; returns False if it was not enrolled."""
+        with self._lock:
+            if speaker_id not in self.speakers:
+                return False
+
+            removed = self.speakers[speaker_id]["row"]
+            keep = [r for r in range(self._matrix.shape[0]) if r != removed]
+            matrix = np.array(self._matrix[keep])
+
+            speakers = {}
+            for sid, entry in self.speakers.items():
+                if sid == speaker_id:
+                    continue
+                row = entry["row"]
+                speakers[sid] = {**entry, "row": row - 1 if row > removed else row}
+
+            if not speakers:
+                self._matrix = None
+                if os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+                self._remove_matrices()
+                self._load()
+                return True
+
+            self._write(matrix, speakers)
+            return True
+
+    def list_speakers(self):
+        with self._lock:
+            return {sid: {k: v for k, v in e.items() if k != "row"} for sid, e in self.speakers.items()}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store():
+    """Process-wide embedding store singleton."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore()
+        return _store
@@ -0,0 +1,172 @@
+# src/speaker/speaker_index.py
+"""
+Vectorized similarity index over enrolled speaker embeddings.
+
+Embeddings from SpeakerEmbedder are L2-normalized, so cosine similarity is a
+plain dot product: all segments are scored against all speakers with one
+[N, D] x [D, S] matmul. For very large galleries an approximate mode
+partitions the speakers with spherical k-means and only scores the
+n_probe closest partitions per query (IVF-style).
+"""
+
+import numpy as np
+
+# ----------------------------------------
+# CONFIG: matching
+# ----------------------------------------
+MATCH_THRESHOLD = 0.6      # default cosine threshold for a speaker match
+UNKNOWN_SPEAKER = "Unknown"
+
+
+def _l2_normalize(x):
+    return x / (np.linalg.norm(x, axis=-1, keepdims=True) + 1e-8)
+
+
+class SpeakerIndex:
+    def __init__(
+        self,
+        speaker_ids,
+        embeddings,
+        thresholds=None,
+        default_threshold=MATCH_THRESHOLD,
+        approximate=False,
+        n_lists=None,
+        n_probe=4,
+    ):
+        """
+        speaker_ids: list of S ids
+        embeddings:  [S, D] L2-normalized embeddings (row i ↔ speaker_ids[i])
+        thresholds:  optional {speaker_id: threshold} overrides
+        approximate: partition the gallery and only search n_probe partitions
+        """
+        self.speaker_ids = list(speaker_ids)
+        self.matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.matrix.ndim != 2 or self.matrix.shape[0] != len(self.speaker_ids):
+            raise ValueError("embeddings must be [len(speaker_ids), D]")
+
+        thresholds = thresholds or {}
+        self.thresholds = np.array(
+            [thresholds.get(sid, default_threshold) for sid in self.speaker_ids],
+            dtype=np.float32,
+        )
+
+        self.n_probe = n_probe
+        self.centroids = None
+        if approximate and len(self.speaker_ids) > 1:
+            n_lists = n_lists or max(1, int(np.sqrt(len(self.speaker_ids))))
+            self._build_partitions(min(n_lists, len(self.speaker_ids)))
+
+    @classmethod
+    def from_store(cls, store, speaker_ids=None, **kwargs):
+        """Build from an EmbeddingStore, optionally restricted to speaker_ids."""
+        ids, matrix = store.matrix()
+        info = store.list_speakers()
+        if speaker_ids is not None:
+            missing = [sid for sid in speaker_ids if sid not in info]
+            if missing:
+                raise KeyError(f"Speakers not enrolled: {', '.join(missing)}")
+            rows = [ids.index(sid) for sid in speaker_ids]
+            ids, matrix = list(speaker_ids), matrix[rows]
+
+        thresholds = {
+            sid: info[sid]["threshold"] for sid in ids if "threshold" in info[sid]
+        }
+        return cls(ids, matrix, thresholds=thresholds, **kwargs)
+
+    def __len__(self):
+        return len(self.speaker_ids)
+
+    def _build_partitions(self, n_lists, n_iter=10, seed=0):
+        """Spherical k-means; rows are re-ordered so each partition is a contiguous slice."""
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(len(self.matrix), n_lists, replace=False)]
+
+        for _ in range(n_iter):
+            assign = np.argmax(self.matrix @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.matrix[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _l2_normalize(centroids)
+
+        assign = np.argmax(self.matrix @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._order = order                                   # sorted row → original row
+        self._sorted = np.ascontiguousarray(self.matrix[order])
+        self._offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+
+    def scores(self, queries):
+        """Exact cosine scores [N, S] for L2-normalized queries [N, D]."""
+        return np.atleast_2d(queries).astype(np.float32, copy=False) @ self.matrix.T
+
+    def search(self, queries, top_k=1):
+        """
+        Top-k speakers per query.
+        Returns (indices [N, k], scores [N, k]), best first; in approximate
+        mode (or with no speakers) rows with fewer than k candidates are
+        padded with -1 / -inf.
+        """
+        queries = np.atleast_2d(queries).astype(np.float32, copy=False)
+        top_k = max(1, min(top_k, len(self.speaker_ids)))
+        if len(self.speaker_ids) == 0:
+            # Nothing to rank: every row is padding
+            return (np.full((len(queries), top_k), -1, dtype=np.int64),
+                    np.full((len(queries), top_k), -np.inf, dtype=np.float32))
+
+        if self.centroids is None:
+            return self._top_k(self.scores(queries), top_k)
+
+        n = len(queries)
+        idx_out = np.full((n, top_k), -1, dtype=np.int64)
+        score_out = np.full((n, top_k), -np.inf, dtype=np.float32)
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :n_probe]
+
+        for i, q in enumerate(queries):
+            cand = np.concatenate(
+                [np.arange(self._offsets[c], self._offsets[c + 1]) for c in probes[i]]
+            )
+            if len(cand) == 0:
+                continue
+            s = self._sorted[cand] @ q
+            k = min(top_k, len(cand))
+            idx, sc = self._top_k(s[None, :], k)
+            idx_out[i, :k] = self._order[cand[idx[0]]]
+            score_out[i, :k] = sc[0]
+
+        return idx_out, score_out
+
+    @staticmethod
+    def _top_k(scores, k):
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        return (
+            np.take_along_axis(part, order, axis=1),
+            np.take_along_axis(part_scores, order, axis=1),
+        )
+
+    def passes(self, indices, scores, margin=0.0):
+        """Boolean mask: search() results scoring at least their speaker's threshold minus margin."""
+        if len(self.speaker_ids) == 0:
+            return np.zeros(np.shape(indices), dtype=bool)
+        return (indices >= 0) & (scores >= self.thresholds[np.maximum(indices, 0)] - margin)
+
+    def match(self, queries, top_k=1):
+        """
+        Per query, the top-k speakers that pass their own threshold:
+            [[{"speaker_id", "score"}, ...], ...]   (empty list = no match)
+        """
+        indices, scores = self.search(queries, top_k)
+        passed = self.passes(indices, scores)
+
+        results = []
+        for row_idx, row_scores, row_pass in zip(indices, scores, passed):
+            results.append([
+                {"speaker_id": self.speaker_ids[j], "score": float(s)}
+                for j, s, ok in zip(row_idx, row_scores, row_pass) if ok
+            ])
+        return results
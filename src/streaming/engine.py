@@ -0,0 +1,236 @@
+# src/streaming/engine.py
+"""
+Incremental streaming ASR for the WebSocket path.
+
+Audio is written into a preallocated ring buffer, a stateful frame-level
+VAD tracks utterance start / end, and ASR runs only on newly finalized
+utterances (plus optional partial hypotheses over a bounded trailing
+window). Per-chunk cost and memory do not grow with session length.
+"""
+
+import numpy as np
+
+from src.preprocess.vad import frame_energy, DEFAULT_FRAME_MS
+from src.preprocess.denoise import StreamingDenoiser
+
+# ----------------------------------------
+# CONFIG: streaming defaults
+# ----------------------------------------
+STREAM_SR = 16000
+RING_SEC = 30                 # ring buffer capacity
+STREAM_RMS_THRESHOLD = 0.015  # same scale as simple_vad
+MIN_SPEECH_MS = 90            # speech needed to open an utterance
+MIN_SILENCE_MS = 500          # silence needed to close (endpoint) it
+PRE_ROLL_MS = 200             # audio kept before the detected onset
+MAX_UTTERANCE_SEC = 20        # force an endpoint on very long turns
+
+
+class RingBuffer:
+    """
+    Fixed-capacity float32 ring buffer addressed by absolute sample index.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buf = np.zeros(self.capacity, dtype=np.float32)
+        self.total = 0     # samples written since the stream started
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest sample still held."""
+        return max(0, self.total - self.capacity)
+
+    def write(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if len(chunk) > self.capacity:
+            self.total += len(chunk) - self.capacity
+            chunk = chunk[-self.capacity:]
+
+        pos = self.total % self.capacity
+        first = min(len(chunk), self.capacity - pos)
+        self.buf[pos:pos + first] = chunk[:first]
+        self.buf[:len(chunk) - first] = chunk[first:]
+        self.total += len(chunk)
+
+    def read(self, start, end):
+        """Copy of samples [start, end), clamped to what is still buffered."""
+        start = max(int(start), self.oldest)
+        end = min(int(end), self.total)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+
+        s = start % self.capacity
+        e = s + (end - start)
+        if e <= self.capacity:
+            return self.buf[s:e].copy()
+        return np.concatenate([self.buf[s:], self.buf[:e - self.capacity]])
+
+
+class StreamingVAD:
+    """
+    Stateful energy VAD with endpointing.
+
+    push(chunk) returns events as tuples:
+        ("start", start_sample)
+        ("end", start_sample, end_sample)
+    Sample indices are absolute from the start of the stream.
+    """
+
+    def __init__(
+        self,
+        sr=STREAM_SR,
+        frame_ms=DEFAULT_FRAME_MS,
+        threshold=STREAM_RMS_THRESHOLD,
+        min_speech_ms=MIN_SPEECH_MS,
+        min_silence_ms=MIN_SILENCE_MS,
+        pre_roll_ms=PRE_ROLL_MS,
+        max_utterance_sec=MAX_UTTERANCE_SEC,
+    ):
+        self.frame_len = int(sr * frame_ms / 1000)
+        self.energy_threshold = threshold ** 2
+        self.min_speech_frames = max(1, int(min_speech_ms / frame_ms))
+        self.min_silence_frames = max(1, int(min_silence_ms / frame_ms))
+        self.pre_roll = int(sr * pre_roll_ms / 1000)
+        self.max_utterance = int(sr * max_utterance_sec)
+
+        self._residual = np.zeros(0, dtype=np.float32)
+        self._frame_idx = 0          # absolute index of the next frame
+        self.in_speech = False
+        self.utt_start = None
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def push(self, chunk):
+        audio = np.concatenate([self._residual, chunk]) if len(self._residual) else chunk
+        n_frames = len(audio) // self.frame_len
+        self._residual = audio[n_frames * self.frame_len:].copy()
+        if n_frames == 0:
+            return []
+
+        is_speech = frame_energy(audio[:n_frames * self.frame_len], self.frame_len) > self.energy_threshold
+
+        events = []
+        for speech in is_speech:
+            f = self._frame_idx
+            self._frame_idx += 1
+
+            if not self.in_speech:
+                self._speech_run = self._speech_run + 1 if speech else 0
+                if self._speech_run >= self.min_speech_frames:
+                    onset = (f - self._speech_run + 1) * self.frame_len
+                    self.utt_start = max(0, onset - self.pre_roll)
+                    self.in_speech = True
+                    self._silence_run = 0
+                    events.append(("start", self.utt_start))
+                continue
+
+            self._silence_run = 0 if speech else self._silence_run + 1
+            if self._silence_run >= self.min_silence_frames:
+                end = (f - self._silence_run + 1) * self.frame_len
+                events.append(("end", self.utt_start, end))
+                self.in_speech = False
+                self._speech_run = 0
+            elif (f + 1) * self.frame_len - self.utt_start >= self.max_utterance:
+                # Very long turn: finalize and keep going
+                end = (f + 1) * self.frame_len
+                events.append(("end", self.utt_start, end))
+                self.utt_start = end
+                self._silence_run = 0
+                events.append(("start", end))
+
+        return events
+
+    def flush(self):
+        """Close any open utterance at the end of the stream."""
+        events = []
+        if self.in_speech:
+            end = self._frame_idx * self.frame_len + len(self._residual)
+            events.append(("end", self.utt_start, end))
+            self.in_speech = False
+        self._speech_run = 0
+        return events
+
+
+class StreamingTranscriber:
+    """
+    Ring buffer + StreamingVAD + ASR on finalized utterances.
+
+    process(chunk) returns a list of messages:
+        {"type": "final",   "text", "confidence", "start", "end"}
+        {"type": "partial", "text", "confidence", "start", "end"}
+    Timestamps are seconds since the stream started.
+    """
+
+    def __init__(
+        self,
+        asr,
+        sr=STREAM_SR,
+        ring_sec=RING_SEC,
+        partial_interval_sec=None,   # None disables partial hypotheses
+        partial_window_sec=5.0,
+        denoise=False,
+        **vad_kwargs
+    ):
+        self.asr = asr
+        self.sr = sr
+        # Denoised output is sample-aligned with the input, so timestamps hold
+        self.denoiser = StreamingDenoiser(sr) if denoise else None
+        self.vad = StreamingVAD(sr=sr, **vad_kwargs)
+
+        # Ring must hold a full utterance plus its pre-roll
+        capacity = max(int(ring_sec * sr), self.vad.max_utterance + self.vad.pre_roll + sr)
+        self.ring = RingBuffer(capacity)
+
+        self.partial_interval = int(partial_interval_sec * sr) if partial_interval_sec else None
+        self.partial_window = int(partial_window_sec * sr)
+        self._last_partial = 0
+
+    def _transcribe(self, kind, start, end):
+        audio = self.ring.read(start, end)
+        if len(audio) == 0:
+            return None
+        text, conf = self.asr.transcribe(audio, self.sr)
+        return {
+            "type": kind,
+            "text": text,
+            "confidence": float(conf),
+            "start": start / self.sr,
+            "end": end / self.sr,
+        }
+
+    def _handle(self, events):
+        messages = []
+        for ev in events:
+            if ev[0] == "start":
+                self._last_partial = ev[1]
+            else:
+                msg = self._transcribe("final", ev[1], ev[2])
+                if msg is not None:
+                    messages.append(msg)
+        return messages
+
+    def process(self, chunk):
+        if self.denoiser is not None:
+            chunk = self.denoiser.process(chunk)
+        self.ring.write(chunk)
+        messages = self._handle(self.vad.push(chunk))
+
+        # Partial hypothesis over a bounded trailing window of the open utterance
+        if self.partial_interval and self.vad.in_speech:
+            now = self.ring.total
+            if now - self._last_partial >= self.partial_interval:
+                start = max(self.vad.utt_start, now - self.partial_window)
+                msg = self._transcribe("partial", start, now)
+                if msg is not None:
+                    messages.append(msg)
+                self._last_partial = now
+
+        return messages
+
+    def flush(self):
+        messages = []
+        if self.denoiser is not None:
+            tail = self.denoiser.flush()
+            self.ring.write(tail)
+            messages = self._handle(self.vad.push(tail))
+        return messages + self._handle(self.vad.flush())
@@ -0,0 +1,160 @@
+# src/utils/audio_cache.py
+"""
+Persistent cache of decoded audio.
+
+Decoded + resampled waveforms are stored as float32 .npy files keyed by a
+content hash of the source file bytes and the target sample rate, and
+handed back as read-only memory maps (np.load(mmap_mode="r")), so repeat
+runs on the same recordings skip decoding and resampling entirely.
+The cache directory is capped in size; least recently used entries
+(by file mtime, refreshed on every hit) are evicted first.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from src.utils.audio_io import load_audio
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__ + "/../.."))
+
+# ----------------------------------------
+# CONFIG: decoded-audio cache
+# ----------------------------------------
+AUDIO_CACHE_DIR = os.environ.get(
+    "AUDIO_CACHE_DIR", os.path.join(PROJECT_ROOT, "data", "cache", "audio")
+)
+AUDIO_CACHE_MAX_MB = float(os.environ.get("AUDIO_CACHE_MAX_MB", 2048))
+HASH_CHUNK_BYTES = 4 * 1024 * 1024
+AUDIO_DIGEST_MEMO = 1024       # file digests remembered (LRU)
+
+
+def file_digest(path):
+    """blake2b hex digest of a file's bytes, read in chunks."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AudioCache:
+    def __init__(self, root_dir=AUDIO_CACHE_DIR, max_mb=AUDIO_CACHE_MAX_MB,
+                 digest_memo=AUDIO_DIGEST_MEMO):
+        self.root_dir = root_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.digest_memo = digest_memo
+        os.makedirs(root_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # (path, size, mtime_ns) → digest, so unchanged files are not re-hashed
+        # (bounded: upload temp paths are never seen twice)
+        self._digests = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def digest(self, path):
+        """Content digest of path, memoized while the file is unchanged."""
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+
+        digest = file_digest(path)
+        with self._lock:
+            self._digests[key] = digest
+            while len(self._digests) > self.digest_memo:
+                self._digests.popitem(last=False)
+        return digest
+
+    def _entry_path(self, digest, target_sr):
+        return os.path.join(self.root_dir, f"{digest}_{target_sr}.npy")
+
+    def load(self, path, target_sr=16000):
+        """
+        Same contract as load_audio(path, target_sr) → (audio, sr), but the
+        audio is a read-only float32 memory map served from the cache.
+        """
+        entry = self._entry_path(self.digest(path), target_sr)
+
+        if os.path.exists(entry):
+            try:
+                audio = np.load(entry, mmap_mode="r")
+                os.utime(entry)          # refresh LRU position
+                with self._lock:
+                    self._counters["hits"] += 1
+                return audio, target_sr
+            except (OSError, ValueError):
+                pass                      # unreadable entry: decode again
+
+        with self._lock:
+            self._counters["misses"] += 1
+
+        audio, sr = load_audio(path, target_sr=target_sr)
+        tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp, np.ascontiguousarray(audio, dtype=np.float32))
+        os.replace(tmp, entry)
+
+        self.evict()
+        return np.load(entry, mmap_mode="r"), sr
+
+    def _entries(self):
+        entries = []
+        for e in os.scandir(self.root_dir):
+            if e.is_file() and e.name.endswith(".npy") and ".tmp" not in e.name:
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            # Never evict the most recent entry (the one just written)
+            for _, size, path in entries[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue             # still mapped (Windows): try the next one
+                total -= size
+                self._counters["evictions"] += 1
+
+    def stats(self):
+        """Hit / miss / eviction counters and current on-disk size."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "size_mb": self.size_bytes() / (1024 * 1024),
+            "max_mb": self.max_bytes / (1024 * 1024),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """Process-wide decoded-audio cache singleton."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache()
+        return _cache
+
+
+def load_audio_cached(path, target_sr=16000):
+    """Drop-in replacement for load_audio backed by the decoded-audio cache."""
+    return get_audio_cache().load(path, target_sr=target_sr)
@@ -1,6 +1,18 @@
+import struct
+from math import gcd
 import librosa
 import soundfile as sf
 import numpy as np
+from scipy.signal import resample_poly
+
+# soundfile subtype → (numpy dtype, scale, offset) for memory-mappable PCM WAV
+_WAV_MMAP_SUBTYPES = {
+    "PCM_U8": ("u1", 128.0, 128.0),
+    "PCM_16": ("<i2", 32768.0, 0.0),
+    "PCM_32": ("<i4", 2147483648.0, 0.0),
+    "FLOAT": ("<f4", 1.0, 0.0),
+    "DOUBLE": ("<f8", 1.0, 0.0),
+}
 
 
 def load_audio(path, target_sr=16000):
@@ -44,3 +56,126 @@ def pad_audio(audio, target_len):
         return audio[:target_len]
     pad_length = target_len - len(audio)
     return np.pad(audio, (0, pad_length))
+
+
+def _wav_data_offset(path):
+    """Byte offset of the RIFF 'data' chunk, or None if not a plain RIFF/WAVE file."""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"data":
+                return f.tell()
+            f.seek(size + (size & 1), 1)
+
+
+class AudioSource:
+    """
+    Lazy, random-access view of an audio file at target_sr, mono float32.
+
+    Nothing is decoded up front: read(start_sec, end_sec) / slicing decode
+    only the requested range. PCM / float WAV files are memory-mapped;
+    other formats use soundfile seek + read. Resampling is polyphase
+    (resample_poly) with enough aligned input context around each request
+    that a block equals the same span of a whole-file resample, so block
+    boundaries leave no seams.
+
+    Indexing is in target-rate samples, so a VadSegment can use an
+    AudioSource as its source buffer.
+    """
+
+    def __init__(self, path, target_sr=16000):
+        self.path = path
+        self.sr = target_sr
+
+        info = sf.info(path)
+        self.orig_sr = info.samplerate
+        self.channels = info.channels
+        self.orig_frames = info.frames
+
+        g = gcd(self.orig_sr, target_sr)
+        self._up = target_sr // g
+        self._down = self.orig_sr // g
+
+        # resample_poly's FIR spans 10 * max(up, down) taps each side (upsampled rate);
+        # keep that much input context, rounded to the polyphase period
+        half = -(-10 * max(self._up, self._down) // self._up) + 1
+        self._margin = -(-half // self._down) * self._down
+
+        self.length = -(-self.orig_frames * self._up // self._down)
+
+        self._mmap = None
+        if info.format in ("WAV", "WAVEX") and info.subtype in _WAV_MMAP_SUBTYPES:
+            offset = _wav_data_offset(path)
+            if offset is not None:
+                dtype, self._scale, self._offset = _WAV_MMAP_SUBTYPES[info.subtype]
+                self._mmap = np.memmap(
+                    path, dtype=dtype, mode="r", offset=offset,
+                    shape=(self.orig_frames, self.channels),
+                )
+
+    @property
+    def duration(self):
+        return self.orig_frames / self.orig_sr
+
+    def __len__(self):
+        return self.length
+
+    def _read_orig(self, start, end):
+        """Mono float32 samples [start, end) at the file's own rate."""
+        start, end = max(0, start), min(self.orig_frames, end)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+
+        if self._mmap is not None:
+            x = self._mmap[start:end].astype(np.float32)
+            if self._offset:
+                x -= self._offset
+            x /= self._scale
+        else:
+            with sf.SoundFile(self.path) as f:
+                f.seek(start)
+                x = f.read(end - start, dtype="float32", always_2d=True)
+
+        return x.mean(axis=1) if x.shape[1] > 1 else x[:, 0]
+
+    def read_samples(self, start, end):
+        """Target-rate samples [start, end)."""
+        start, end = max(0, int(start)), min(self.length, int(end))
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+        if self._up == self._down:
+            return self._read_orig(start, end)
+
+        # Input span aligned to the polyphase period, plus filter context
+        in_start = max(0, (start * self._down // self._up) // self._down * self._down - self._margin)
+        in_end = -(-end * self._down // self._up) + self._margin
+
+        y = resample_poly(self._read_orig(in_start, in_end), self._up, self._down)
+        out_start = in_start // self._down * self._up
+        return y[start - out_start:end - out_start].astype(np.float32, copy=False)
+
+    def read(self, start_sec=0.0, end_sec=None):
+        """Samples between start_sec and end_sec (16 kHz mono float32 by default)."""
+        end = self.length if end_sec is None else int(round(end_sec * self.sr))
+        return self.read_samples(int(round(start_sec * self.sr)), end)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("AudioSource only supports contiguous slices")
+        start = 0 if key.start is None else key.start
+        end = self.length if key.stop is None else key.stop
+        return self.read_samples(start, end)
+
+    def blocks(self, block_sec=30.0, start_sec=0.0, end_sec=None):
+        """Yield (block_start_sec, samples) for consecutive blocks."""
+        block = int(block_sec * self.sr)
+        start = int(round(start_sec * self.sr))
+        end = self.length if end_sec is None else min(self.length, int(round(end_sec * self.sr)))
+        for s in range(start, end, block):
+            yield s / self.sr, self.read_samples(s, min(s + block, end))
@@ -0,0 +1,427 @@
+# src/utils/backends.py
+"""
+CPU inference backends for WhisperASR, TinyWhisperASR and SpeakerEmbedder.
+
+    eager        plain PyTorch fp32 (current behaviour, default)
+    int8         dynamic int8 quantization of every nn.Linear
+    torchscript  traced graph of the heavy sub-network
+    onnx         the same sub-network exported to ONNX, run with onnxruntime
+
+The graph backends replace only the sub-network that dominates CPU time and
+has a generate()-free forward: the Whisper encoder (fixed [B, 80, 3000]
+input) and the WavLM backbone under the x-vector head. Decoding and pooling
+stay in PyTorch. Exported graphs are cached under BACKEND_CACHE_DIR, so the
+trace / export cost is paid once per machine; int8 conversion is done in
+memory at load time (it takes seconds and produces no portable artifact).
+Artifact names include the model revision and the torch / transformers /
+onnxruntime versions, so an upgrade never loads a stale graph. A fresh
+export is checked against the eager module on a second input shape and
+only cached if it agrees; Whisper backends also run one generate() step
+through the exported encoder before they are handed out.
+
+check_backend_accuracy compares a backend against eager fp32 on sample
+audio: embedding cosine for the embedder, WER for the ASR engines.
+"""
+
+import os
+import re
+import time
+import tempfile
+import numpy as np
+import torch
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except Exception:
+    ONNXRUNTIME_AVAILABLE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__ + "/../.."))
+
+# ----------------------------------------
+# CONFIG: inference backends
+# ----------------------------------------
+BACKENDS = ("eager", "int8", "torchscript", "onnx")
+BACKEND_CACHE_DIR = os.environ.get(
+    "BACKEND_CACHE_DIR", os.path.join(PROJECT_ROOT, "data", "cache", "backends")
+)
+ONNX_OPSET = 17
+EXPORT_MIN_COSINE = 0.999     # exported vs eager outputs on the check input
+
+
+def _safe(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(name))
+
+
+def _artifact_path(model_id, part, backend, revision=None):
+    """
+    Cache file for an exported sub-network (model ids may contain '/').
+    The name carries the model revision and the library versions that
+    produced it.
+    """
+    import transformers
+    versions = [f"rev-{(revision or 'local')[:12]}", f"torch-{torch.__version__}",
+                f"tf-{transformers.__version__}"]
+    if backend == "onnx":
+        versions.append(f"ort-{ort.__version__}")
+    ext = "onnx" if backend == "onnx" else "pt"
+    os.makedirs(BACKEND_CACHE_DIR, exist_ok=True)
+    name = ".".join([_safe(model_id), part, *map(_safe, versions), ext])
+    return os.path.join(BACKEND_CACHE_DIR, name)
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of all linear layers (weights int8, activations fp32)."""
+    model = model.float().eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _OnnxModule(torch.nn.Module):
+    """Runs an onnxruntime session behind a torch module interface."""
+
+    def __init__(self, path, input_names):
+        super().__init__()
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = input_names
+        self.artifact_bytes = os.path.getsize(path)     # for the registry memory budget
+
+    def forward(self, *inputs):
+        feed = {
+            name: x.detach().cpu().numpy()
+            for name, x in zip(self.input_names, inputs) if x is not None
+        }
+        return tuple(torch.from_numpy(o) for o in self.session.run(None, feed))
+
+
+class _ScriptModule(torch.nn.Module):
+    """A loaded torchscript graph (weights frozen into it, not in parameters())."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.graph = torch.jit.optimize_for_inference(torch.jit.load(path).eval())
+        self.artifact_bytes = os.path.getsize(path)     # for the registry memory budget
+
+    def forward(self, *inputs):
+        return self.graph(*inputs)
+
+
+def _load_graph(path, backend, input_names):
+    if backend == "torchscript":
+        return _ScriptModule(path)
+    return _OnnxModule(path, input_names)
+
+
+def check_exported_graph(graph, module, check_inputs, min_cosine=EXPORT_MIN_COSINE):
+    """
+    Compare an exported graph with the eager module on check_inputs (a shape
+    different from the trace example). Returns the lowest per-row cosine
+    over all outputs; raises RuntimeError below min_cosine or on a shape
+    mismatch.
+    """
+    with torch.no_grad():
+        ref = module(*check_inputs)
+        out = graph(*check_inputs)
+
+    worst = 1.0
+    for i, (r, o) in enumerate(zip(ref, out)):
+        if tuple(r.shape) != tuple(o.shape):
+            raise RuntimeError(f"exported output {i} has shape {tuple(o.shape)}, eager {tuple(r.shape)}")
+        r = r.float().reshape(r.shape[0], -1)
+        o = o.float().reshape(o.shape[0], -1)
+        cos = torch.nn.functional.cosine_similarity(r, o, dim=1, eps=1e-8)
+        worst = min(worst, float(cos.min()))
+    if worst < min_cosine:
+        raise RuntimeError(f"exported graph diverges from eager (min cosine {worst:.5f})")
+    return worst
+
+
+def export_graph(module, example_inputs, model_id, part, backend, input_names, dynamic_axes,
+                 check_inputs=None, revision=None):
+    """
+    Traced (torchscript) or ONNX version of module, loaded from the on-disk
+    cache if present, otherwise exported once and saved.
+    module must return a tuple of tensors. A new export is checked against
+    the eager module on check_inputs and not cached if it diverges.
+    """
+    if backend == "onnx" and not ONNXRUNTIME_AVAILABLE:
+        raise RuntimeError("onnxruntime not available; install it or use another backend")
+
+    path = _artifact_path(model_id, part, backend, revision)
+    module = module.float().eval()
+
+    if not os.path.exists(path):
+        print(f"→ Exporting {part} of {model_id} ({backend}) to {path}")
+        # Per-process temp file: pool workers may export at the same time
+        fd, tmp = tempfile.mkstemp(dir=BACKEND_CACHE_DIR, prefix=os.path.basename(path) + ".",
+                                   suffix=".tmp")
+        os.close(fd)
+        try:
+            with torch.no_grad():
+                if backend == "torchscript":
+                    traced = torch.jit.trace(module, example_inputs, strict=False, check_trace=False)
+                    torch.jit.save(traced, tmp)
+                else:
+                    torch.onnx.export(
+                        module, example_inputs, tmp,
+                        input_names=input_names,
+                        output_names=[f"out_{i}" for i in range(_n_outputs(module, example_inputs))],
+                        dynamic_axes=dynamic_axes,
+                        opset_version=ONNX_OPSET,
+                    )
+            if check_inputs is not None:
+                cos = check_exported_graph(_load_graph(tmp, backend, input_names), module, check_inputs)
+                print(f"→ Export check passed (min cosine {cos:.5f})")
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    return _load_graph(path, backend, input_names)
+
+
+def _n_outputs(module, example_inputs):
+    with torch.no_grad():
+        return len(module(*example_inputs))
+
+
+# ----------------------------------------
+# Whisper: encoder graph
+# ----------------------------------------
+
+class _EncoderGraph(torch.nn.Module):
+    def __init__(self, encoder):
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, input_features):
+        return (self.encoder(input_features, return_dict=True).last_hidden_state,)
+
+
+class _ExportedWhisperEncoder(torch.nn.Module):
+    """Drop-in for WhisperEncoder inside generate(): only last_hidden_state."""
+
+    def __init__(self, graph, encoder):
+        super().__init__()
+        self.graph = graph
+        self.config = encoder.config
+        self.main_input_name = getattr(encoder, "main_input_name", "input_features")
+        # generate() reads the conv strides to compute the input frame rate
+        self.conv1 = encoder.conv1
+        self.conv2 = encoder.conv2
+
+    def forward(self, input_features, attention_mask=None, head_mask=None,
+                output_attentions=None, output_hidden_states=None, return_dict=None, **kwargs):
+        from transformers.modeling_outputs import BaseModelOutput
+        hidden = self.graph(input_features.float())[0]
+        return BaseModelOutput(last_hidden_state=hidden.to(input_features.dtype))
+
+
+def apply_whisper_backend(model, backend, model_id, feature_extractor):
+    """Return model (a WhisperForConditionalGeneration) converted to backend."""
+    if backend == "eager":
+        return model
+    if backend == "int8":
+        return quantize_int8(model)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' (choose from {', '.join(BACKENDS)})")
+
+    encoder = model.get_encoder()
+    example = torch.zeros(1, feature_extractor.feature_size, feature_extractor.nb_max_frames)
+    check = torch.randn(3, feature_extractor.feature_size, feature_extractor.nb_max_frames)
+    graph = export_graph(
+        _EncoderGraph(encoder), (example,), model_id, "encoder", backend,
+        input_names=["input_features"],
+        dynamic_axes={"input_features": {0: "batch"}, "out_0": {0: "batch"}},
+        check_inputs=(check,), revision=getattr(model.config, "_commit_hash", None),
+    )
+    model.model.encoder = _ExportedWhisperEncoder(graph, encoder)
+    try:
+        cos = check_generate(model, encoder, check[:1])
+    except Exception:
+        model.model.encoder = encoder
+        raise
+    print(f"→ generate() check passed (min cosine {cos:.5f})")
+    return model
+
+
+def check_generate(model, eager_encoder, input_features, min_cosine=EXPORT_MIN_COSINE):
+    """
+    Run generate() through the exported encoder already swapped into model
+    and compare its first-step logits with the eager encoder's. Returns the
+    cosine; raises RuntimeError below min_cosine.
+    """
+    def first_scores():
+        with torch.no_grad():
+            out = model.generate(
+                input_features.to(model.dtype), max_new_tokens=1, do_sample=False,
+                return_dict_in_generate=True, output_scores=True,
+            )
+        scores = out.scores[0].float()
+        return torch.where(torch.isfinite(scores), scores, torch.zeros_like(scores))
+
+    out = first_scores()
+    exported, model.model.encoder = model.model.encoder, eager_encoder
+    try:
+        ref = first_scores()
+    finally:
+        model.model.encoder = exported
+
+    cos = float(torch.nn.functional.cosine_similarity(ref, out, dim=1, eps=1e-8).min())
+    if cos < min_cosine:
+        raise RuntimeError(f"generate() with the exported encoder diverges from eager (cosine {cos:.5f})")
+    return cos
+
+
+# ----------------------------------------
+# WavLM: backbone graph
+# ----------------------------------------
+
+class _BackboneGraph(torch.nn.Module):
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+
+    def forward(self, input_values, attention_mask):
+        out = self.backbone(
+            input_values, attention_mask=attention_mask,
+            output_hidden_states=True, return_dict=True,
+        )
+        return (out.last_hidden_state, out.extract_features, *out.hidden_states)
+
+
+class _ExportedBackbone(torch.nn.Module):
+    """Drop-in for WavLMModel under WavLMForXVector (hidden states included)."""
+
+    def __init__(self, graph, backbone):
+        super().__init__()
+        self.graph = graph
+        self.config = backbone.config
+
+    def forward(self, input_values, attention_mask=None, **kwargs):
+        from transformers.modeling_outputs import Wav2Vec2BaseModelOutput
+        if attention_mask is None:
+            attention_mask = torch.ones(input_values.shape, dtype=torch.long)
+        outs = self.graph(input_values.float(), attention_mask.long())
+        return Wav2Vec2BaseModelOutput(
+            last_hidden_state=outs[0],
+            extract_features=outs[1],
+            hidden_states=tuple(outs[2:]),
+        )
+
+
+def apply_embedder_backend(model, backend, model_id, sr=16000):
+    """Return model (a WavLMForXVector) converted to backend."""
+    if backend == "eager":
+        return model
+    if backend == "int8":
+        return quantize_int8(model)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' (choose from {', '.join(BACKENDS)})")
+
+    example = (torch.zeros(2, 2 * sr), torch.ones(2, 2 * sr, dtype=torch.long))
+    # Different batch size and a length that is not a multiple of the frame hop
+    check_len = 3 * sr + 1234
+    check = (torch.randn(1, check_len) * 0.1, torch.ones(1, check_len, dtype=torch.long))
+    n_hidden = model.config.num_hidden_layers + 1
+    dynamic_axes = {
+        "input_values": {0: "batch", 1: "samples"},
+        "attention_mask": {0: "batch", 1: "samples"},
+        **{f"out_{i}": {0: "batch", 1: "frames"} for i in range(2 + n_hidden)},
+    }
+    graph = export_graph(
+        _BackboneGraph(model.wavlm), example, model_id, "wavlm", backend,
+        input_names=["input_values", "attention_mask"],
+        dynamic_axes=dynamic_axes,
+        check_inputs=check, revision=getattr(model.config, "_commit_hash", None),
+    )
+    model.wavlm = _ExportedBackbone(graph, model.wavlm)
+    return model
+
+
+# ----------------------------------------
+# Accuracy check against eager fp32
+# ----------------------------------------
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance / number of reference words."""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    dist = np.arange(len(hyp) + 1)
+    for i, r in enumerate(ref, 1):
+        prev = dist.copy()
+        dist[0] = i
+        for j, h in enumerate(hyp, 1):
+            dist[j] = min(prev[j] + 1, dist[j - 1] + 1, prev[j - 1] + (r != h))
+    return float(dist[-1] / len(ref))
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def check_backend_accuracy(backend, audio, sr, kinds=("SpeakerEmbedder", "TinyWhisperASR", "WhisperASR"),
+                           clip_sec=5.0, device="cpu"):
+    """
+    Compare backend against eager fp32 on sample audio.
+    The audio is cut into clip_sec clips. Returns per kind:
+        SpeakerEmbedder:  mean / min embedding cosine
+        ASR engines:      WER of the backend transcript vs the fp32 one
+    plus eager / backend wall time and the speedup.
+    """
+    from src.speaker.embedder import SpeakerEmbedder
+    from src.asr.asr_tiny import TinyWhisperASR
+    from src.asr.asr_engine import WhisperASR
+
+    clip = int(clip_sec * sr)
+    clips = [audio[i:i + clip] for i in range(0, len(audio), clip) if len(audio[i:i + clip]) >= sr // 2]
+    builders = {
+        "SpeakerEmbedder": lambda b: SpeakerEmbedder(device=device, backend=b),
+        "TinyWhisperASR": lambda b: TinyWhisperASR(device=device, backend=b),
+        "WhisperASR": lambda b: WhisperASR(device=device, backend=b),
+    }
+
+    report = {}
+    for kind in kinds:
+        ref_model, test_model = builders[kind]("eager"), builders[kind](backend)
+
+        if kind == "SpeakerEmbedder":
+            ref, t_ref = _timed(lambda: ref_model.embed_batch(clips, sr))
+            out, t_out = _timed(lambda: test_model.embed_batch(clips, sr))
+            cos = np.sum(ref * out, axis=1)
+            entry = {"cosine_mean": float(cos.mean()), "cosine_min": float(cos.min())}
+        else:
+            ref, t_ref = _timed(lambda: ref_model.transcribe_batch(clips, sr))
+            out, t_out = _timed(lambda: test_model.transcribe_batch(clips, sr))
+            entry = {"wer": word_error_rate(
+                " ".join(t for t, _ in ref), " ".join(t for t, _ in out)
+            )}
+
+        entry.update({
+            "eager_sec": t_ref,
+            "backend_sec": t_out,
+            "speedup": t_ref / max(t_out, 1e-9),
+        })
+        report[kind] = entry
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    if len(sys.argv) < 3:
+        print("Usage: python -m src.utils.backends <audiofile.wav> <int8|torchscript|onnx>")
+        exit()
+
+    from src.utils.audio_io import load_audio
+    audio, sr = load_audio(sys.argv[1])
+    print(json.dumps(check_backend_accuracy(sys.argv[2], audio, sr), indent=2))
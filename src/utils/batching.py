@@ -0,0 +1,44 @@
+# src/utils/batching.py
+"""
+Helpers for grouping variable-length inputs into padded batches.
+"""
+
+import numpy as np
+
+
+def item_lengths(items):
+    """Lengths of a list of arrays, or the precomputed .lengths of a lazy sequence."""
+    lengths = getattr(items, "lengths", None)
+    return lengths if lengths is not None else [len(x) for x in items]
+
+
+def length_sorted_batches(lengths, batch_size, max_batch_samples=None):
+    """
+    Group item indices into batches of similar length.
+
+    Items are sorted by length so each batch pads to a near-uniform size.
+    A batch is closed when it holds batch_size items or when its padded size
+    (count * longest) would exceed max_batch_samples.
+    Returns a list of index arrays (into the original order).
+    """
+    lengths = np.asarray(lengths)
+    order = np.argsort(lengths, kind="stable")
+
+    batches = []
+    current = []
+    for idx in order:
+        longest = lengths[idx]   # sorted ascending: the new item is the longest
+        too_many = len(current) >= batch_size
+        too_big = (
+            max_batch_samples is not None
+            and current
+            and (len(current) + 1) * longest > max_batch_samples
+        )
+        if too_many or too_big:
+            batches.append(np.array(current, dtype=np.int64))
+            current = []
+        current.append(idx)
+
+    if current:
+        batches.append(np.array(current, dtype=np.int64))
+    return batches
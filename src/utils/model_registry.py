@@ -0,0 +1,254 @@
+# src/utils/model_registry.py
+"""
+Process-wide model registry.
+
+Hands out already-loaded model wrappers (SpeakerEmbedder, WhisperASR,
+TinyWhisperASR, Punctuator, DemucsEngine) keyed by (kind, model id, device, dtype,
+backend), so the
+pipeline pays the deserialization cost once per process instead of once per
+call. A memory budget is enforced with LRU eviction.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# ----------------------------------------
+# CONFIG: memory budget for loaded models
+# ----------------------------------------
+DEFAULT_MAX_MEMORY_MB = float(os.environ.get("MODEL_REGISTRY_MAX_MB", 4096))
+DEFAULT_DTYPE = "float32"
+# eager | int8 | torchscript | onnx (see src/utils/backends.py)
+DEFAULT_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+
+
+def _module_bytes(module):
+    """
+    Size of a torch module's parameters + buffers in bytes, plus weights
+    the backends keep elsewhere: packed int8 Linear weights and the
+    artifact size of exported graphs (artifact_bytes, see backends.py).
+    """
+    total = 0
+    for t in list(module.parameters()) + list(module.buffers()):
+        total += t.numel() * t.element_size()
+    for m in module.modules():
+        packed = getattr(m, "_packed_params", None)
+        if hasattr(packed, "_weight_bias"):
+            total += sum(t.numel() * t.element_size() for t in packed._weight_bias() if t is not None)
+        total += getattr(m, "artifact_bytes", 0)
+    return total
+
+
+def estimate_model_bytes(instance, _depth=3, _seen=None):
+    """
+    Rough memory footprint of a model wrapper.
+    Walks a few attribute levels looking for torch modules
+    (e.g. Punctuator.model.pipe.model).
+    """
+    seen = _seen if _seen is not None else set()
+    if id(instance) in seen:
+        return 0
+    seen.add(id(instance))
+
+    if hasattr(instance, "parameters") and hasattr(instance, "buffers"):
+        try:
+            return _module_bytes(instance)
+        except Exception:
+            return 0
+
+    if _depth == 0 or not hasattr(instance, "__dict__"):
+        return 0
+    return sum(
+        estimate_model_bytes(v, _depth - 1, seen) for v in vars(instance).values()
+    )
+
+
+def _apply_dtype(instance, dtype):
+    """Cast the wrapped torch model to dtype (no-op for float32)."""
+    if not dtype or dtype == DEFAULT_DTYPE:
+        return instance
+    import torch
+    model = getattr(instance, "model", None)
+    if model is not None and hasattr(model, "to"):
+        instance.model = model.to(dtype=getattr(torch, dtype))
+    return instance
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU cache of loaded models.
+
+    Entries are keyed by (kind, model_id, device, dtype, backend). When the summed
+    footprint exceeds max_memory_mb, least recently used entries are evicted
+    (callers still holding a reference keep that instance alive).
+    """
+
+    def __init__(self, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self._entries = OrderedDict()     # key -> (instance, nbytes)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "evictions": 0,
+            "load_seconds": 0.0,
+        }
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get(self, kind, model_id, loader, device="cpu", dtype=DEFAULT_DTYPE, backend="eager"):
+        """
+        Return the cached instance for (kind, model_id, device, dtype, backend),
+        calling loader() to build it on a miss.
+        """
+        if backend != "eager" and dtype != DEFAULT_DTYPE:
+            raise ValueError(f"Backend '{backend}' requires dtype {DEFAULT_DTYPE}")
+        key = (kind, model_id, device, dtype, backend)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key][0]
+
+        # Load outside the global lock so other models stay available
+        with self._key_lock(key):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return self._entries[key][0]
+                self._stats["misses"] += 1
+
+            t0 = time.perf_counter()
+            instance = _apply_dtype(loader(), dtype)
+            elapsed = time.perf_counter() - t0
+            nbytes = estimate_model_bytes(instance)
+
+            with self._lock:
+                self._entries[key] = (instance, nbytes)
+                self._stats["loads"] += 1
+                self._stats["load_seconds"] += elapsed
+                self._evict_locked(keep=key)
+
+        print(f"→ Loaded {kind} [{model_id}] in {elapsed:.2f}s ({nbytes / 1e6:.0f} MB)")
+        return instance
+
+    def _evict_locked(self, keep=None):
+        while self._total_bytes_locked() > self.max_memory_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._entries.pop(oldest)
+            self._stats["evictions"] += 1
+
+    def _total_bytes_locked(self):
+        return sum(nbytes for _, nbytes in self._entries.values())
+
+    def evict(self, kind=None):
+        """Drop all entries (or all entries of one kind)."""
+        with self._lock:
+            for key in list(self._entries):
+                if kind is None or key[0] == kind:
+                    self._entries.pop(key)
+                    self._stats["evictions"] += 1
+
+    def stats(self):
+        """Load / hit / miss counters plus the currently resident models."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "resident_mb": self._total_bytes_locked() / (1024 * 1024),
+                "max_memory_mb": self.max_memory_bytes / (1024 * 1024),
+                "models": [
+                    {
+                        "kind": k[0],
+                        "model_id": k[1],
+                        "device": k[2],
+                        "dtype": k[3],
+                        "backend": k[4],
+                        "mb": nbytes / (1024 * 1024),
+                    }
+                    for k, (_, nbytes) in self._entries.items()
+                ],
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry singleton."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+# ----------------------------------------
+# Convenience accessors used by the pipeline
+# ----------------------------------------
+
+def get_speaker_embedder(device="cpu", dtype=DEFAULT_DTYPE, backend=DEFAULT_BACKEND):
+    from src.speaker.embedder import SpeakerEmbedder, EMBEDDER_MODEL
+    return get_registry().get(
+        "SpeakerEmbedder", EMBEDDER_MODEL,
+        lambda: SpeakerEmbedder(device=device, backend=backend),
+        device=device, dtype=dtype, backend=backend,
+    )
+
+
+def get_tiny_asr(device="cpu", local_model_path=None, dtype=DEFAULT_DTYPE, backend=DEFAULT_BACKEND):
+    from src.asr.asr_tiny import TinyWhisperASR, TINY_MODEL
+    model_id = local_model_path if local_model_path else TINY_MODEL
+    return get_registry().get(
+        "TinyWhisperASR", model_id,
+        lambda: TinyWhisperASR(device=device, local_model_path=local_model_path, backend=backend),
+        device=device, dtype=dtype, backend=backend,
+    )
+
+
+def get_whisper_asr(model_name_or_path="openai/whisper-small", device="cpu",
+                    local_model_path=None, dtype=DEFAULT_DTYPE, backend=DEFAULT_BACKEND):
+    from src.asr.asr_engine import WhisperASR
+    model_id = local_model_path if local_model_path else model_name_or_path
+    return get_registry().get(
+        "WhisperASR", model_id,
+        lambda: WhisperASR(
+            model_name_or_path=model_name_or_path,
+            device=device,
+            local_model_path=local_model_path,
+            backend=backend,
+        ),
+        device=device, dtype=dtype, backend=backend,
+    )
+
+
+def get_punctuator(device="cpu"):
+    from src.postprocess.punctuator import Punctuator, DEFAULT_PUNCT_MODEL
+    return get_registry().get(
+        "Punctuator", DEFAULT_PUNCT_MODEL,
+        lambda: Punctuator(device=device),
+        device=device,
+    )
+
+
+def get_demucs(model_name=None, device="cpu"):
+    from src.separation.demucs_wrapper import DemucsEngine, DEMUCS_MODEL
+    model_name = model_name or DEMUCS_MODEL
+    return get_registry().get(
+        "DemucsEngine", model_name,
+        lambda: DemucsEngine(model_name=model_name, device=device),
+        device=device,
+    )
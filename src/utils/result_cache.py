@@ -0,0 +1,252 @@
+# src/utils/result_cache.py
+"""
+Content-addressed cache of pipeline results.
+
+A result is keyed by a hash of everything it depends on: the content
+digests of the input audio (mixture and target sample), or the enrolled
+speaker ids together with their stored embeddings, plus every pipeline
+parameter (thresholds, model ids, backend, use_demucs, ...). Resubmitting
+the same inputs with the same settings returns the stored result without
+running denoise / VAD / embedding / ASR / punctuation again.
+
+Results are JSON files under RESULT_CACHE_DIR, evicted by age
+(RESULT_CACHE_TTL_SEC since written; the file mtime) and by total size
+(least recently used first; the file atime, set on every hit). A small
+in-process LRU sits in front of the disk so hot results skip the file read.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__ + "/../.."))
+
+# ----------------------------------------
+# CONFIG: result cache
+# ----------------------------------------
+RESULT_CACHE_DIR = os.environ.get(
+    "RESULT_CACHE_DIR", os.path.join(PROJECT_ROOT, "data", "cache", "results")
+)
+RESULT_CACHE_MAX_MB = float(os.environ.get("RESULT_CACHE_MAX_MB", 256))
+RESULT_CACHE_TTL_SEC = float(os.environ.get("RESULT_CACHE_TTL_SEC", 7 * 24 * 3600))
+RESULT_CACHE_MEMORY_ITEMS = 128
+RESULT_CACHE_VERSION = 2        # bump when the result format or key changes
+
+
+def pipeline_params(**params):
+    """
+    Settings every pipeline result depends on, one dict per stage, merged
+    with the caller's params. Read from the stage modules' own constants so
+    changing any of them invalidates the cached results.
+    """
+    from src.utils.model_registry import DEFAULT_BACKEND
+    from src.preprocess.denoise import NOISE_SEC, DENOISE_BLOCK_SEC
+    from src.preprocess import vad
+    from src.speaker import embedder
+    from src.speaker.speaker_index import MATCH_THRESHOLD
+    from src.asr.asr_tiny import TINY_MODEL, TINY_MAX_NEW_TOKENS
+    from src.postprocess.punctuator import DEFAULT_PUNCT_MODEL
+    stages = {
+        "backend": DEFAULT_BACKEND,
+        "denoise": {"noise_sec": NOISE_SEC, "block_sec": DENOISE_BLOCK_SEC},
+        "vad": {
+            "min_chunk_sec": vad.MIN_CHUNK_SEC, "frame_ms": vad.DEFAULT_FRAME_MS,
+            "threshold": vad.ENERGY_VAD_THRESHOLD,
+            "rel_threshold": vad.SPECTRAL_VAD_REL_THRESHOLD,
+            "min_speech_ms": vad.VAD_MIN_SPEECH_MS,
+            "min_silence_ms": vad.VAD_MIN_SILENCE_MS,
+        },
+        "embedder": {
+            "model": embedder.EMBEDDER_MODEL,
+            "window_sec": embedder.EMBED_WINDOW_SEC,
+            "window_overlap_sec": embedder.EMBED_WINDOW_OVERLAP_SEC,
+            "min_window_sec": embedder.EMBED_MIN_WINDOW_SEC,
+            "max_windows": embedder.EMBED_MAX_WINDOWS,
+            "frame_window_sec": embedder.FRAME_WINDOW_SEC,
+            "frame_overlap_sec": embedder.FRAME_OVERLAP_SEC,
+        },
+        "match_threshold": MATCH_THRESHOLD,
+        "asr": {"model": TINY_MODEL, "max_new_tokens": TINY_MAX_NEW_TOKENS, "do_sample": False},
+        "punctuator": {"model": DEFAULT_PUNCT_MODEL},
+    }
+    if params.get("use_demucs"):
+        from src.separation.demucs_wrapper import DEMUCS_MODEL
+        stages["separation"] = {"model": DEMUCS_MODEL}
+    return {**stages, **params}
+
+
+def array_digest(array):
+    """blake2b hex digest of a numpy array's bytes (e.g. an enrolled embedding)."""
+    import numpy as np
+    return hashlib.blake2b(np.ascontiguousarray(array).tobytes(), digest_size=20).hexdigest()
+
+
+def result_key(inputs, params):
+    """
+    Cache key for a result.
+    inputs: input identities (audio digests, speaker ids / embedding digests)
+    params: pipeline settings, e.g. pipeline_params(...)
+    """
+    payload = json.dumps(
+        {"version": RESULT_CACHE_VERSION, "inputs": list(inputs), "params": params},
+        sort_keys=True, default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root_dir=RESULT_CACHE_DIR, max_mb=RESULT_CACHE_MAX_MB,
+                 ttl_sec=RESULT_CACHE_TTL_SEC, memory_items=RESULT_CACHE_MEMORY_ITEMS):
+        self.root_dir = root_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl_sec = ttl_sec
+        self.memory_items = memory_items
+        os.makedirs(root_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()    # key → (created, result)
+        self._counters = {"hits": 0, "memory_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def _entry_path(self, key):
+        return os.path.join(self.root_dir, f"{key}.json")
+
+    def _expired(self, created):
+        return self.ttl_sec > 0 and time.time() - created > self.ttl_sec
+
+    def _remember_locked(self, key, created, result):
+        self._memory[key] = (created, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _touch(self, path, created):
+        try:
+            os.utime(path, (time.time(), created))   # LRU position; mtime stays the write time
+        except OSError:
+            pass
+
+    def get(self, key):
+        """Cached result for key, or None (missing or expired)."""
+        path = self._entry_path(key)
+        with self._lock:
+            entry = self._memory.get(key)
+            fresh = entry is not None and not self._expired(entry[0])
+            if fresh:
+                self._memory.move_to_end(key)
+                self._counters["hits"] += 1
+                self._counters["memory_hits"] += 1
+            else:
+                self._memory.pop(key, None)
+        if fresh:
+            self._touch(path, entry[0])
+            return entry[1]
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        with self._lock:
+            if entry is not None and self._expired(entry["created"]):
+                self._remove(path)
+                self._counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            self._remember_locked(key, entry["created"], entry["result"])
+        self._touch(path, entry["created"])
+        return entry["result"]
+
+    def put(self, key, result):
+        """Store a JSON-serializable result under key."""
+        created = time.time()
+        path = self._entry_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"created": created, "result": result}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        os.utime(path, (created, created))
+
+        with self._lock:
+            self._remember_locked(key, created, result)
+        self.evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _entries(self):
+        entries = []
+        for e in os.scandir(self.root_dir):
+            if e.is_file() and e.name.endswith(".json"):
+                st = e.stat()
+                entries.append((st.st_atime, st.st_size, e.path, st.st_mtime))
+        return entries
+
+    def evict(self):
+        """
+        Delete entries older than the TTL, then least recently used ones
+        until the cache fits max_bytes.
+        """
+        with self._lock:
+            entries = []
+            for used, size, path, written in sorted(self._entries()):
+                if self._expired(written) and self._remove(path):
+                    self._counters["expired"] += 1
+                    continue
+                entries.append((used, size, path))
+
+            total = sum(size for _, size, _ in entries)
+            # Never evict the most recent entry (the one just written)
+            for _, size, path in entries[:-1]:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    total -= size
+                    self._counters["evictions"] += 1
+                    key = os.path.basename(path)[:-len(".json")]
+                    self._memory.pop(key, None)
+
+    def clear(self):
+        """Drop every cached result (memory and disk)."""
+        with self._lock:
+            self._memory.clear()
+            for _, _, path, _ in self._entries():
+                self._remove(path)
+
+    def stats(self):
+        """Hit / miss / eviction counters and current on-disk size."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "size_mb": sum(e[1] for e in self._entries()) / (1024 * 1024),
+            "max_mb": self.max_bytes / (1024 * 1024),
+            "ttl_sec": self.ttl_sec,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide result cache singleton."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,248 @@
+# src/utils/stages.py
+"""
+Small stage-graph (DAG) executor for the offline pipelines.
+
+Stages declare the named values they consume and produce:
+
+    graph = StageGraph()
+    graph.add("load", load_fn, inputs=("path",), outputs=("audio", "sr"))
+    graph.add("embed", embed_fn, inputs=("audio", "sr"), outputs=("emb",))
+    values = graph.run(path="mix.wav")
+
+A stage starts as soon as all of its inputs exist, so independent branches
+run concurrently on the executor (a thread pool by default; torch, numpy and
+soundfile release the GIL in their kernels).
+
+Stream stages (add_stream) are generator functions. Their output is a
+bounded channel that consumers start reading immediately, so a segment-level
+stage begins on the first item while the producer is still working on later
+ones. Every consumer gets its own queue of STREAM_QUEUE_SIZE items; a slow
+consumer blocks the producer (backpressure).
+
+Wall time per stage is recorded in graph.timings.
+"""
+
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# ----------------------------------------
+# CONFIG: stage execution
+# ----------------------------------------
+STREAM_QUEUE_SIZE = 4       # items buffered per stream consumer
+POLL_SEC = 0.1              # how often blocked stream ends check for cancellation
+
+
+class StageCancelled(RuntimeError):
+    pass
+
+
+class _Stage:
+    def __init__(self, name, fn, inputs, outputs, stream=False):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.stream = stream
+
+
+class Stream:
+    """Bounded fan-out channel: one producer, one queue per consumer."""
+
+    _END = object()
+
+    def __init__(self, name, cancelled, maxsize=STREAM_QUEUE_SIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self._cancelled = cancelled
+        self._queues = []
+
+    def subscribe(self):
+        q = queue.Queue(self.maxsize)
+        self._queues.append(q)
+        return _StreamReader(q, self._cancelled)
+
+    def _put(self, q, item):
+        while True:
+            try:
+                q.put(item, timeout=POLL_SEC)
+                return
+            except queue.Full:
+                if self._cancelled.is_set():
+                    raise StageCancelled(f"stream '{self.name}' cancelled")
+
+    def put(self, item):
+        for q in self._queues:
+            self._put(q, (item, None))
+
+    def close(self, error=None):
+        for q in self._queues:
+            try:
+                self._put(q, (self._END, error))
+            except StageCancelled:
+                pass
+
+
+class _StreamReader:
+    """Iterator over one consumer's queue; re-raises producer errors."""
+
+    def __init__(self, q, cancelled):
+        self._q = q
+        self._cancelled = cancelled
+
+    def __iter__(self):
+        while True:
+            try:
+                item, error = self._q.get(timeout=POLL_SEC)
+            except queue.Empty:
+                if self._cancelled.is_set():
+                    raise StageCancelled("stream cancelled")
+                continue
+            if item is Stream._END:
+                if error is not None:
+                    raise StageCancelled(f"upstream stage failed: {error}")
+                return
+            yield item
+
+
+class StageGraph:
+    def __init__(self, executor=None, stream_queue_size=STREAM_QUEUE_SIZE):
+        """
+        executor: optional concurrent.futures executor; by default a thread
+        pool with one thread per stage (stream stages block on their queues,
+        so each needs its own thread). Stream stages need a thread executor.
+        """
+        self.executor = executor
+        self.stream_queue_size = stream_queue_size
+        self.stages = OrderedDict()
+        self.timings = OrderedDict()
+
+    def add(self, name, fn, inputs=(), outputs=()):
+        """fn(*inputs) → value (one output) or tuple (several outputs)."""
+        return self._add(_Stage(name, fn, inputs, outputs))
+
+    def add_stream(self, name, fn, inputs=(), output=None):
+        """fn(*inputs) is a generator; consumers of `output` iterate its items."""
+        return self._add(_Stage(name, fn, inputs, (output or name,), stream=True))
+
+    def _add(self, stage):
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage '{stage.name}'")
+        produced = {o for s in self.stages.values() for o in s.outputs}
+        dup = produced.intersection(stage.outputs)
+        if dup:
+            raise ValueError(f"Stage '{stage.name}' re-declares output(s) {sorted(dup)}")
+        self.stages[stage.name] = stage
+        return self
+
+    # ----------------------------------------
+    # Execution
+    # ----------------------------------------
+
+    def _call(self, stage, args, stream):
+        t0 = time.perf_counter()
+        try:
+            if stream is None:
+                return stage.fn(*args)
+            try:
+                for item in stage.fn(*args):
+                    stream.put(item)
+            except Exception as e:
+                stream.close(error=e)
+                raise
+            stream.close()
+            return None
+        finally:
+            self.timings[stage.name] = time.perf_counter() - t0
+
+    def run(self, **initial):
+        """Execute all stages; returns every produced (non-stream) value by name."""
+        values = dict(initial)
+        produced = set(values) | {o for s in self.stages.values() for o in s.outputs}
+        for stage in self.stages.values():
+            missing = [i for i in stage.inputs if i not in produced]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' needs unknown input(s) {missing}")
+
+        # One subscription per (stream, consumer), made before anything runs
+        cancelled = threading.Event()
+        streams, readers = {}, {}
+        for stage in self.stages.values():
+            if stage.stream:
+                streams[stage.outputs[0]] = Stream(stage.outputs[0], cancelled, self.stream_queue_size)
+        for stage in self.stages.values():
+            for i in stage.inputs:
+                if i in streams:
+                    readers[(stage.name, i)] = streams[i].subscribe()
+
+        self.timings.clear()
+        executor = self.executor or ThreadPoolExecutor(
+            max_workers=max(1, len(self.stages)), thread_name_prefix="stage"
+        )
+        pending = OrderedDict(self.stages)
+        running = {}
+        try:
+            while pending or running:
+                # Submit until nothing new is ready (a started stream makes
+                # its consumers ready within the same pass)
+                progress = True
+                while progress:
+                    progress = False
+                    for name, stage in list(pending.items()):
+                        if not all(i in values for i in stage.inputs):
+                            continue
+                        args = [readers.get((name, i), values.get(i)) for i in stage.inputs]
+                        stream = streams.get(stage.outputs[0]) if stage.stream else None
+                        running[executor.submit(self._call, stage, args, stream)] = stage
+                        del pending[name]
+                        progress = True
+                        if stream is not None:
+                            values[stage.outputs[0]] = stream    # readable right away
+
+                if not running:
+                    raise ValueError(f"Stages can never run (cycle?): {list(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                errors = [fut.exception() for fut in done if fut.exception() is not None]
+                if errors:
+                    raise self._first_error(errors, running, done, cancelled)
+                for fut in done:
+                    stage = running.pop(fut)
+                    result = fut.result()
+                    if stage.stream or not stage.outputs:
+                        continue
+                    if len(stage.outputs) == 1:
+                        result = (result,)
+                    values.update(zip(stage.outputs, result))
+        except BaseException:
+            cancelled.set()
+            for fut in running:
+                fut.cancel()
+            raise
+        finally:
+            if self.executor is None:
+                executor.shutdown(wait=True)
+
+        return {k: v for k, v in values.items() if not isinstance(v, Stream)}
+
+    @staticmethod
+    def _first_error(errors, running, done, cancelled):
+        """
+        Cancel the run and return the error to report. A failing stage makes
+        its stream neighbours raise StageCancelled, possibly in the same (or
+        an earlier) wait() round, so every stage is let finish and the
+        original error is preferred over the cancellations it caused.
+        """
+        cancelled.set()
+        others = [fut for fut in running if fut not in done and not fut.cancel()]
+        wait(others)
+        errors += [fut.exception() for fut in others if fut.exception() is not None]
+        return next((e for e in errors if not isinstance(e, StageCancelled)), errors[0])
+
+    def timing_report(self, title="Stage timings"):
+        lines = [f"→ {title}:"]
+        for name, sec in sorted(self.timings.items(), key=lambda kv: -kv[1]):
+            lines.append(f"    {name:<20s} {sec:8.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,332 @@
+# src/utils/worker_pool.py
+"""
+Multi-process inference worker pool.
+
+Starts N worker processes, each pinned to its own slice of CPU cores with
+torch.set_num_threads matching that slice, and each holding its own
+preloaded models (every process has its own model registry). numpy arrays
+are handed to workers through multiprocessing.shared_memory: the parent
+copies an array into a shared block once and workers map it, so audio is
+never pickled.
+
+Used by JobManager (POOL_PROCESSES > 0) for /api/process, and by the
+diarizer / batch scripts to shard segment embedding and ASR across cores.
+"""
+
+import os
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# ----------------------------------------
+# CONFIG: worker processes
+# ----------------------------------------
+POOL_PROCESSES = int(os.environ.get("POOL_PROCESSES", 0))   # 0 = no process pool
+POOL_PRELOAD = ("SpeakerEmbedder", "TinyWhisperASR")
+MIN_SHARED_BYTES = 64 * 1024    # smaller arrays are just pickled
+SHARE_BLOCK_SEC = 60.0          # AudioSource copied into shared memory block by block
+
+
+class SharedArray:
+    """
+    Picklable handle to a numpy array copied into shared memory.
+    The creating process owns the block and must call release().
+    """
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self._allocate(array.shape, array.dtype)
+        self._view()[...] = array
+
+    def _allocate(self, shape, dtype):
+        dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.dtype = dtype.str
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=max(int(np.prod(self.shape)) * dtype.itemsize, 1)
+        )
+        self.name = self._shm.name
+
+    def _view(self):
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @classmethod
+    def from_source(cls, source, block_sec=SHARE_BLOCK_SEC):
+        """
+        Shared copy of an AudioSource, decoded block by block straight into
+        the shared block (never a second full copy in this process).
+        """
+        self = cls.__new__(cls)
+        n = len(source)
+        self._allocate((n,), np.float32)
+        block = max(1, int(block_sec * source.sr))
+        view = self._view()
+        for start in range(0, n, block):
+            end = min(n, start + block)
+            view[start:end] = source.read_samples(start, end)
+        del view
+        return self
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
+
+    def attach(self):
+        """(shm, read-only view) in a worker; close shm when done."""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, track=False)
+        except TypeError:
+            # Python < 3.13 registers every attach with the resource tracker,
+            # which would then report the block as leaked and unlink it a
+            # second time. Only the creating process should track it.
+            shm = shared_memory.SharedMemory(name=self.name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        view = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+        view.flags.writeable = False
+        return shm, view
+
+    def release(self):
+        if self._shm is not None:
+            self._shm.close()
+            # Spawned workers share this process's tracker, so a worker's
+            # unregister may have dropped our entry; re-register (a no-op
+            # if still present) so unlink's unregister is balanced
+            resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+            self._shm = None
+
+
+# ----------------------------------------
+# Worker side
+# ----------------------------------------
+
+_worker_device = "cpu"      # the pool's device, set by _init_worker
+
+
+def _init_worker(core_queue, preload, device):
+    global _worker_device
+    _worker_device = device
+    cores = core_queue.get()
+    if cores:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(len(cores))
+
+    import torch
+    torch.set_num_threads(max(1, len(cores) if cores else 1))
+    torch.set_num_interop_threads(1)
+
+    from src.utils import model_registry
+    loaders = {
+        "SpeakerEmbedder": model_registry.get_speaker_embedder,
+        "TinyWhisperASR": model_registry.get_tiny_asr,
+        "WhisperASR": model_registry.get_whisper_asr,
+        "Punctuator": model_registry.get_punctuator,
+    }
+    for kind in preload:
+        loaders[kind](device=device)
+
+
+def _run_task(fn, args, kwargs):
+    """Attach SharedArray arguments, run fn, detach."""
+    attached = []
+
+    def resolve(x):
+        if isinstance(x, SharedArray):
+            shm, view = x.attach()
+            attached.append(shm)
+            return view
+        return x
+
+    args = [resolve(a) for a in args]
+    kwargs = {k: resolve(v) for k, v in kwargs.items()}
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        del args, kwargs
+        for shm in attached:
+            try:
+                shm.close()
+            except BufferError:
+                pass        # result still references the block; freed with it
+
+
+def _embed_task(audio, sr, bounds):
+    from src.utils.model_registry import get_speaker_embedder
+    return get_speaker_embedder(device=_worker_device).embed_batch([audio[s:e] for s, e in bounds], sr)
+
+
+def _embed_windowed_task(audio, sr):
+    from src.utils.model_registry import get_speaker_embedder
+    return get_speaker_embedder(device=_worker_device).embed_windowed(audio, sr)
+
+
+def _transcribe_task(audio, sr, bounds):
+    from src.utils.model_registry import get_tiny_asr
+    return get_tiny_asr(device=_worker_device).transcribe_batch([audio[s:e] for s, e in bounds], sr)
+
+
+# ----------------------------------------
+# Pool
+# ----------------------------------------
+
+def _core_slices(processes):
+    """Split the cores this process may use into `processes` contiguous slices."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if processes > len(cores):
+        return [[] for _ in range(processes)]      # oversubscribed: no pinning
+    return [list(map(int, s)) for s in np.array_split(cores, processes)]
+
+
+class InferencePool:
+    def __init__(self, processes=None, preload=POOL_PRELOAD, device="cpu", pin_cores=True):
+        """
+        processes: worker count (default: POOL_PROCESSES, else one per 4 cores)
+        preload:   registry kinds each worker loads at startup
+        pin_cores: give each worker its own core slice + matching torch threads
+        """
+        self.processes = processes or POOL_PROCESSES or max(1, (os.cpu_count() or 1) // 4)
+        self.device = device
+
+        ctx = mp.get_context("spawn")
+        core_queue = ctx.Queue()
+        slices = _core_slices(self.processes) if pin_cores else [[]] * self.processes
+        for cores in slices:
+            core_queue.put(cores)
+        self.cores = slices
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(core_queue, tuple(preload), device),
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in a worker; returns a Future.
+        fn must be importable (module level). numpy arrays of at least
+        MIN_SHARED_BYTES go through shared memory, released when fn finishes.
+        """
+        owned = []
+
+        def share(x):
+            if isinstance(x, np.ndarray) and x.nbytes >= MIN_SHARED_BYTES:
+                x = SharedArray(x)
+                owned.append(x)
+            return x
+
+        args = tuple(share(a) for a in args)
+        kwargs = {k: share(v) for k, v in kwargs.items()}
+        try:
+            future = self.executor.submit(_run_task, fn, args, kwargs)
+        except Exception:
+            for s in owned:
+                s.release()
+            raise
+        if owned:
+            future.add_done_callback(lambda _: [s.release() for s in owned])
+        return future
+
+    def _shards(self, lengths):
+        """Longest-first assignment of items to workers, balancing total samples."""
+        load = np.zeros(self.processes)
+        shards = [[] for _ in range(self.processes)]
+        for i in np.argsort(-np.asarray(lengths), kind="stable"):
+            w = int(np.argmin(load))
+            shards[w].append(int(i))
+            load[w] += lengths[i]
+        return [np.array(s, dtype=np.int64) for s in shards if s]
+
+    def share(self, audio):
+        """
+        One shared copy of audio (numpy array or AudioSource) to pass to
+        several embed_segments / transcribe_segments calls; the caller
+        releases it.
+        """
+        if isinstance(audio, np.ndarray):
+            return SharedArray(audio)
+        return SharedArray.from_source(audio)
+
+    def _map_segments(self, task, audio, sr, bounds):
+        """
+        Run task over segment bounds sharded across workers; results in input order.
+        audio may be a SharedArray from share(), reused as is; an array is
+        copied into shared memory for this call only.
+        """
+        bounds = np.asarray(bounds, dtype=np.int64).reshape(-1, 2)
+        if len(bounds) == 0:
+            return [], []
+
+        owned = not isinstance(audio, SharedArray)
+        shared = SharedArray(audio) if owned else audio
+        try:
+            shards = self._shards(bounds[:, 1] - bounds[:, 0])
+            futures = [self.executor.submit(_run_task, task, (shared, sr, bounds[idx]), {})
+                       for idx in shards]
+            return shards, [f.result() for f in futures]
+        finally:
+            if owned:
+                shared.release()
+
+    def embed_segments(self, audio, sr, bounds):
+        """Speaker embeddings [N, D] for audio[start:end] per (start, end) in bounds."""
+        shards, results = self._map_segments(_embed_task, audio, sr, bounds)
+        if not results:
+            return np.zeros((0, 0), dtype=np.float32)
+        out = np.zeros((len(bounds), results[0].shape[1]), dtype=np.float32)
+        for idx, emb in zip(shards, results):
+            out[idx] = emb
+        return out
+
+    def embed_windowed(self, audio, sr):
+        """Sub-window embedding of one long clip (e.g. a target sample) in a worker."""
+        return self.submit(_embed_windowed_task, audio, sr).result()
+
+    def transcribe_segments(self, audio, sr, bounds):
+        """Tiny-Whisper (text, confidence) per (start, end) in bounds."""
+        shards, results = self._map_segments(_transcribe_task, audio, sr, bounds)
+        out = [None] * len(bounds)
+        for idx, res in zip(shards, results):
+            for i, r in zip(idx, res):
+                out[i] = r
+        return out
+
+    def map(self, fn, items, *args, **kwargs):
+        """fn(item, *args, **kwargs) for every item (e.g. files), run concurrently."""
+        futures = [self.submit(fn, item, *args, **kwargs) for item in items]
+        return [f.result() for f in futures]
+
+    def stats(self):
+        return {
+            "processes": self.processes,
+            "device": self.device,
+            "cores": self.cores,
+        }
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool():
+    """Process-wide pool singleton, or None when POOL_PROCESSES is 0."""
+    global _pool
+    if POOL_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = InferencePool(POOL_PROCESSES)
+        return _pool
@@ -8,12 +8,16 @@ Run the offline pipeline:
 
 import json
 import os
-from src.utils.audio_io import load_audio, save_audio, normalize_audio
-from src.preprocess.denoise import denoise_audio
-from src.preprocess.vad import simple_energy_vad
-from src.separation.separator import simple_hpss_separation
-from src.speaker.embedder import SpeakerEmbedder
-from src.asr.asr_engine import WhisperASR
+import numpy as np
+from src.utils.audio_io import save_audio
+from src.utils.audio_cache import load_audio_cached
+from src.preprocess.frontend import SpectralFrontend
+from src.preprocess.denoise import denoise_spectrogram
+from src.preprocess.vad import segment_frontend_by_vad
+from src.separation.separator import hpss_spectrogram
+from src.separation.overlap import subwindow_embeddings, overlap_regions, splice_separated
+from src.utils.model_registry import get_speaker_embedder, get_whisper_asr
+from src.utils.stages import StageGraph
 
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
@@ -26,91 +30,160 @@ OUT_DIR = os.path.join(PROJECT_ROOT, "data", "outputs")
 os.makedirs(OUT_DIR, exist_ok=True)
 TARGET_SPEAKER_OUT = os.path.join(OUT_DIR, "target_speaker.wav")
 DIARIZATION_JSON = os.path.join(OUT_DIR, "diarization.json")
+TIMINGS_JSON = os.path.join(OUT_DIR, "timings.json")
 
 # options
 WHISPER_LOCAL_MODEL = None  # set to "models/whisper-small" if you downloaded model locally
 WHISPER_MODEL = "openai/whisper-small"  # fallback HF name (we will use 'small' as requested)
 DEVICE = "cpu"
+OVERLAP_GATED = True   # separate only regions flagged as overlapping speech
+USE_DEMUCS = False     # separator for those regions (HPSS otherwise)
+
+
+# ----------------------------------------
+# Stages (each takes / returns named graph values)
+# ----------------------------------------
+
+def load_input(path):
+    return load_audio_cached(path)
 
-def run_pipeline():
-    # 1) load files
-    print("Loading mixture and target sample...")
-    mixture, sr = load_audio(MIXTURE_PATH)
-    target, target_sr = load_audio(TARGET_SAMPLE_PATH)
 
-    # 2) denoise mixture (optional)
+def denoise_stage(mixture, sr):
+    # denoise mixture in the STFT domain
+    # (one STFT is shared by denoise, VAD and HPSS; only s1 / s2 are rebuilt)
     print("Denoising mixture...")
-    denoised = denoise_audio(mixture, sr)
-    denoised = normalize_audio(denoised)
+    return denoise_spectrogram(SpectralFrontend(mixture, sr))
 
-    # 3) VAD (we will keep it simple: detect speech segments)
+
+def vad_stage(denoised):
+    # VAD on the denoised spectrogram's frame energy
+    # (threshold is relative to the loudest frame, so no peak normalization needed)
     print("Running VAD...")
-    segments = simple_energy_vad(denoised, sr, frame_ms=30, threshold=0.0008)
+    segments = segment_frontend_by_vad(denoised)
     if len(segments) == 0:
         print("Warning: no speech segments found by VAD; proceeding with full audio")
-        speech_audio = denoised
-    else:
-        # For now we concatenate speech regions into a continuous speech-only clip for separation
-        from src.preprocess.vad import extract_speech
-        speech_audio = extract_speech(denoised, sr, segments)
+        return denoised
+
+    # Concatenate speech frames (spectrogram columns) into a speech-only clip for separation
+    hop = denoised.hop_length
+    frames = np.concatenate([
+        np.arange(seg.start_sample // hop, seg.end_sample // hop) for seg in segments
+    ])
+    return denoised.select_frames(frames)
 
-    # 4) Separation (simple HPSS-based)
+
+def _peak_normalize(s1, s2):
+    # peak-normalize both streams by the same factor
+    peak = max(np.max(np.abs(s1)), np.max(np.abs(s2)), 1e-8)
+    return s1 / peak, s2 / peak
+
+
+def separate_stage(speech):
+    # Separation (simple HPSS-based, on the same spectrogram)
     print("Running separation (simple HPSS)...")
-    s1, s2 = simple_hpss_separation(speech_audio, sr)
+    harmonic, percussive = hpss_spectrogram(speech)
+    return _peak_normalize(harmonic.audio, percussive.audio)
+
+
+def overlap_stage(speech, sr):
+    # Sub-window embeddings of the speech stream (one backbone pass) and
+    # the regions where they disagree (likely overlapping speakers)
+    print("Detecting overlapping speech...")
+    bounds, embs = subwindow_embeddings(speech.audio, sr)
+    regions = overlap_regions(bounds, embs, len(speech.audio), sr)
+    covered = sum(e - s for s, e in regions) / max(len(speech.audio), 1)
+    print(f"→ {len(regions)} overlap regions ({100 * covered:.1f}% of speech)")
+    return (bounds, embs), regions
+
 
-    # 5) Speaker matching (embedding)
-    print("Loading embedder and computing embeddings...")
-    embedder = SpeakerEmbedder(device=DEVICE)
-    # compute embeddings (embedder truncates long audio)
-    emb_target = embedder.compute_embedding(target, target_sr)
-    emb_s1 = embedder.compute_embedding(s1, sr)
-    emb_s2 = embedder.compute_embedding(s2, sr)
+def gated_separate_stage(speech, sr, subwindows, regions, emb_target):
+    # Separate only the overlap regions; everything else is routed to the
+    # target / other stream by its sub-window embedding
+    print(f"Running overlap-gated separation ({'Demucs' if USE_DEMUCS else 'HPSS'})...")
+    bounds, embs = subwindows
+    s1, s2 = splice_separated(speech.audio, sr, bounds, embs, regions, emb_target, prefer_demucs=USE_DEMUCS)
+    if len(s1) == 0 or len(s2) == 0:
+        print("Warning: one stream is empty after gating; separating the full speech stream")
+        return separate_stage(speech)
+    return _peak_normalize(s1, s2)
 
+
+def embed_stage(audio, sr):
+    # the embedder comes from the shared registry (loaded once for all branches)
+    return get_speaker_embedder(device=DEVICE).compute_embedding(audio, sr)
+
+
+def choose_stage(emb_target, emb_s1, emb_s2, s1, s2):
+    embedder = get_speaker_embedder(device=DEVICE)
     sim1 = embedder.cosine_similarity(emb_target, emb_s1)
     sim2 = embedder.cosine_similarity(emb_target, emb_s2)
     print("Similarity target->s1:", sim1)
     print("Similarity target->s2:", sim2)
+    return (s1, s2) if sim1 > sim2 else (s2, s1)
 
-    if sim1 > sim2:
-        chosen = s1
-        other = s2
-        chosen_label = "Target"
-        other_label = "Speaker_B"
-    else:
-        chosen = s2
-        other = s1
-        chosen_label = "Target"
-        other_label = "Speaker_B"
 
-    # save target speaker waveform
+def save_stage(chosen, sr):
     save_audio(TARGET_SPEAKER_OUT, chosen, sr)
     print("Saved target speaker audio:", TARGET_SPEAKER_OUT)
 
-    # 6) ASR for both streams
-    print("Loading ASR model (Whisper-Small)...")
-    asr = WhisperASR(model_name_or_path=WHISPER_MODEL, device=DEVICE, local_model_path=WHISPER_LOCAL_MODEL)
 
-    print("Transcribing chosen (target) speaker...")
-    text_target, conf_target = asr.transcribe(chosen, sr, max_length_seconds=60)
-    print("Target transcript:", text_target, "conf:", conf_target)
+def asr_stage(audio, sr):
+    asr = get_whisper_asr(model_name_or_path=WHISPER_MODEL, device=DEVICE, local_model_path=WHISPER_LOCAL_MODEL)
+    return asr.transcribe(audio, sr)
+
+
+def build_graph():
+    """
+    Denoise → VAD → separation runs while the target sample is embedded;
+    s1 / s2 embeddings and the two Whisper-Small transcriptions run in parallel.
+    With OVERLAP_GATED, overlap detection runs alongside the target
+    embedding and separation only touches the flagged regions.
+    """
+    graph = StageGraph()
+    graph.add("load_mixture", load_input, inputs=("mixture_path",), outputs=("mixture", "sr"))
+    graph.add("load_target", load_input, inputs=("target_path",), outputs=("target", "target_sr"))
+    graph.add("denoise", denoise_stage, inputs=("mixture", "sr"), outputs=("denoised",))
+    graph.add("vad", vad_stage, inputs=("denoised",), outputs=("speech",))
+    graph.add("embed_target", embed_stage, inputs=("target", "target_sr"), outputs=("emb_target",))
+    if OVERLAP_GATED:
+        graph.add("detect_overlap", overlap_stage, inputs=("speech", "sr"), outputs=("subwindows", "regions"))
+        graph.add("separate", gated_separate_stage,
+                  inputs=("speech", "sr", "subwindows", "regions", "emb_target"), outputs=("s1", "s2"))
+    else:
+        graph.add("separate", separate_stage, inputs=("speech",), outputs=("s1", "s2"))
+    graph.add("embed_s1", embed_stage, inputs=("s1", "sr"), outputs=("emb_s1",))
+    graph.add("embed_s2", embed_stage, inputs=("s2", "sr"), outputs=("emb_s2",))
+    graph.add("choose", choose_stage,
+              inputs=("emb_target", "emb_s1", "emb_s2", "s1", "s2"), outputs=("chosen", "other"))
+    graph.add("save_target", save_stage, inputs=("chosen", "sr"))
+    graph.add("asr_target", asr_stage, inputs=("chosen", "sr"), outputs=("target_result",))
+    graph.add("asr_other", asr_stage, inputs=("other", "sr"), outputs=("other_result",))
+    return graph
 
-    print("Transcribing other speaker...")
-    text_other, conf_other = asr.transcribe(other, sr, max_length_seconds=60)
+
+def run_pipeline():
+    print("Running target extraction (stage graph)...")
+    graph = build_graph()
+    v = graph.run(mixture_path=MIXTURE_PATH, target_path=TARGET_SAMPLE_PATH)
+
+    text_target, conf_target = v["target_result"]
+    text_other, conf_other = v["other_result"]
+    print("Target transcript:", text_target, "conf:", conf_target)
     print("Other transcript:", text_other, "conf:", conf_other)
 
-    # 7) build simple diarization JSON (for now single segment per speaker)
+    # build simple diarization JSON (for now single segment per speaker)
     # Use 0.0 -> duration since we don't have per-turn segmentation yet.
-    duration_sec = float(len(speech_audio) / sr)
+    duration_sec = float(v["speech"].length / v["sr"])
     diar = [
         {
-            "speaker": chosen_label,
+            "speaker": "Target",
             "start": 0.0,
             "end": duration_sec,
             "text": text_target,
             "confidence": round(conf_target, 4)
         },
         {
-            "speaker": other_label,
+            "speaker": "Speaker_B",
             "start": 0.0,
             "end": duration_sec,
             "text": text_other,
@@ -120,8 +193,11 @@ def run_pipeline():
 
     with open(DIARIZATION_JSON, "w", encoding="utf-8") as f:
         json.dump(diar, f, indent=2, ensure_ascii=False)
-
     print("Saved diarization JSON:", DIARIZATION_JSON)
+
+    print(graph.timing_report())
+    with open(TIMINGS_JSON, "w", encoding="utf-8") as f:
+        json.dump(graph.timings, f, indent=2)
     print("Pipeline finished.")
 
 if __name__ == "__main__":
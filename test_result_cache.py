@@ -0,0 +1,122 @@
+import io
+import os
+import json
+import time
+import tempfile
+import numpy as np
+import soundfile as sf
+
+# Keep the test away from data/cache
+os.environ["RESULT_CACHE_DIR"] = tempfile.mkdtemp()
+os.environ["AUDIO_CACHE_DIR"] = tempfile.mkdtemp()
+
+from src.utils.result_cache import ResultCache, result_key
+
+
+def entry_path(cache, key):
+    return os.path.join(cache.root_dir, f"{key}.json")
+
+
+def age(cache, key, seconds):
+    """Pretend the entry was written `seconds` ago (stored time and mtime)."""
+    path = entry_path(cache, key)
+    written = time.time() - seconds
+    with open(path, "r", encoding="utf-8") as f:
+        entry = json.load(f)
+    entry["created"] = written
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.utime(path, (written, written))
+
+
+keys = [result_key([f"audio-{i}"], {"threshold": 0.6}) for i in range(4)]
+assert keys[0] == result_key(["audio-0"], {"threshold": 0.6})
+assert keys[0] != result_key(["audio-0"], {"threshold": 0.7})
+print("Keys depend on inputs and params")
+
+
+# --- TTL expiry: on disk and in the memory front ---
+cache = ResultCache(tempfile.mkdtemp(), ttl_sec=60)
+cache.put(keys[0], {"i": 0})
+cache.put(keys[1], {"i": 1})
+age(cache, keys[0], 120)
+
+fresh = ResultCache(cache.root_dir, ttl_sec=60)   # no memory front yet
+assert fresh.get(keys[0]) is None and not os.path.exists(entry_path(cache, keys[0]))
+assert fresh.get(keys[1]) == {"i": 1}
+print("Expired entry dropped on read:", fresh.stats()["expired"])
+
+cache._memory[keys[1]] = (time.time() - 120, {"i": 1})
+assert cache.get(keys[1]) == {"i": 1}             # stale memory entry falls back to disk
+assert cache._memory[keys[1]][0] > time.time() - 60
+print("Expired memory entry re-read from disk")
+
+age(cache, keys[1], 120)
+cache.evict()
+assert os.listdir(cache.root_dir) == [], os.listdir(cache.root_dir)
+print("evict() removed expired entries")
+
+
+# --- size eviction: least recently used first, memory front follows ---
+cache = ResultCache(tempfile.mkdtemp(), max_mb=0.0005, memory_items=8)   # ~520 bytes
+for i in range(3):
+    cache.put(keys[i], {"i": i, "text": "x" * 150})
+    time.sleep(0.01)
+files = sorted(os.listdir(cache.root_dir))
+assert len(files) < 3 and f"{keys[2]}.json" in files, files
+assert keys[0] not in cache._memory, "evicted entry still served from memory"
+assert cache.get(keys[0]) is None and cache.get(keys[2])["i"] == 2
+print("Size eviction kept", len(files), "entries; evictions:", cache.stats()["evictions"])
+
+cache.clear()
+assert cache.get(keys[2]) is None and os.listdir(cache.root_dir) == []
+print("clear() dropped memory and disk")
+
+
+# --- hit path through /api/process and /api/jobs ---
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import src.api.routes_rest as routes
+
+runs = []
+
+def fake_pipeline(mix_path, tgt_path, *args):
+    runs.append(mix_path)
+    routes._remove_files(mix_path, tgt_path)
+    return [{"speaker": "Target", "start": 0.0, "end": 1.0, "text": "hi", "confidence": 0.5}]
+
+routes.run_process_pipeline = fake_pipeline
+
+app = FastAPI()
+app.include_router(routes.router, prefix="/api")
+client = TestClient(app)
+
+
+def wav(seed):
+    buf = io.BytesIO()
+    audio = np.random.default_rng(seed).normal(size=16000).astype(np.float32) * 0.1
+    sf.write(buf, audio, 16000, format="WAV")
+    return buf.getvalue()
+
+
+def files(seed):
+    return {"mixture": ("mix.wav", wav(seed)), "target": ("target.wav", wav(99))}
+
+
+r = client.post("/api/process", files=files(1))
+assert r.status_code == 200 and r.headers["X-Result-Cache"] == "miss" and len(runs) == 1
+r = client.post("/api/process", files=files(1))
+assert r.headers["X-Result-Cache"] == "hit" and len(runs) == 1, r.headers
+print("/api/process second request:", r.headers["X-Result-Cache"])
+
+r = client.post("/api/process", files=files(1), data={"top_k": "2"})
+assert r.headers["X-Result-Cache"] == "miss" and len(runs) == 2
+print("Changed parameter: miss")
+
+job = client.post("/api/jobs", files=files(1)).json()
+assert job["cached"] and job["status"] == "done" and len(runs) == 2, job
+result = client.get(f"/api/jobs/{job['job_id']}/result").json()
+assert result["cached"], result
+print("/api/jobs served from the cache:", job["job_id"])
+
+print("Result cache checks passed")
@@ -1,5 +1,5 @@
 from src.utils.audio_io import load_audio
-from src.speaker.embedder import SpeakerEmbedder
+from src.utils.model_registry import get_speaker_embedder
 from src.separation.separator import simple_hpss_separation
 
 print("Loading audio files...")
@@ -24,7 +24,7 @@ s1, s2 = simple_hpss_separation(audio, sr)
 print("Speaker 1 length (samples):", len(s1))
 print("Speaker 2 length (samples):", len(s2))
 
-embedder = SpeakerEmbedder()
+embedder = get_speaker_embedder()
 
 print("Computing embeddings...")
 
@@ -0,0 +1,104 @@
+import time
+from src.utils.stages import StageGraph, StageCancelled
+
+
+def expect_error(graph, error, **initial):
+    try:
+        graph.run(**initial)
+    except error as e:
+        return e
+    raise AssertionError(f"expected {error.__name__}")
+
+
+# --- fan-out: both consumers see every streamed item ---
+def numbers(n):
+    for i in range(n):
+        yield i
+
+graph = StageGraph(stream_queue_size=2)
+graph.add("total", lambda items: sum(items), inputs=("nums",), outputs=("total",))
+graph.add("count", lambda items: sum(1 for _ in items), inputs=("nums",), outputs=("count",))
+graph.add_stream("numbers", numbers, inputs=("n",), output="nums")
+values = graph.run(n=100)
+assert values["total"] == sum(range(100)) and values["count"] == 100, values
+print("Fan-out to two consumers:", values["total"], values["count"])
+
+
+# --- a failing producer reaches its consumer ---
+def broken(n):
+    yield 1
+    time.sleep(0.2)                 # consumer is reading by now
+    raise RuntimeError("producer failed")
+
+consumed, seen = [], []
+
+def collect(items):
+    try:
+        for item in items:
+            consumed.append(item)
+    except StageCancelled as e:
+        seen.append(e)
+        raise
+    return len(consumed)
+
+graph = StageGraph()
+graph.add_stream("broken", broken, inputs=("n",), output="items")
+graph.add("collect", collect, inputs=("items",), outputs=("n_items",))
+e = expect_error(graph, RuntimeError, n=3)
+assert consumed == [1] and len(seen) == 1, (consumed, seen)
+print("Producer failure reached the consumer:", seen[0])
+
+
+# --- cancellation unblocks a producer stuck on a full queue ---
+def endless(n):
+    i = 0
+    while True:
+        yield i
+        i += 1
+
+def give_up(items):
+    time.sleep(0.3)                 # let the producer fill its queue and block
+    raise ValueError("consumer failed")
+
+graph = StageGraph(stream_queue_size=1)
+graph.add_stream("endless", endless, inputs=("n",), output="items")
+graph.add("give_up", give_up, inputs=("items",), outputs=("done",))
+t0 = time.perf_counter()
+e = expect_error(graph, ValueError, n=0)
+assert time.perf_counter() - t0 < 5, "producer was not cancelled"
+print("Cancellation unblocked the producer in", round(time.perf_counter() - t0, 2), "s")
+
+
+# --- the consumer's error is reported, not the producer's StageCancelled ---
+def fail_fast(items):
+    next(iter(items))
+    raise ValueError("consumer failed")
+
+for _ in range(20):
+    graph = StageGraph(stream_queue_size=1)
+    graph.add_stream("endless", endless, inputs=("n",), output="items")
+    graph.add("fail_fast", fail_fast, inputs=("items",), outputs=("done",))
+    e = expect_error(graph, Exception, n=0)
+    assert isinstance(e, ValueError), repr(e)
+print("Original error reported over cancellations:", e)
+
+
+# --- unknown inputs and cycles are rejected ---
+graph = StageGraph()
+graph.add("a", lambda x: x, inputs=("missing",), outputs=("y",))
+print("Unknown input:", expect_error(graph, ValueError))
+
+graph = StageGraph()
+graph.add("a", lambda y: y, inputs=("y",), outputs=("x",))
+graph.add("b", lambda x: x, inputs=("x",), outputs=("y",))
+print("Cycle:", expect_error(graph, ValueError))
+
+graph = StageGraph()
+graph.add("a", lambda: 1, outputs=("x",))
+try:
+    graph.add("b", lambda: 2, outputs=("x",))
+    raise AssertionError("duplicate output accepted")
+except ValueError as e:
+    print("Duplicate output:", e)
+
+print("Stage graph checks passed")